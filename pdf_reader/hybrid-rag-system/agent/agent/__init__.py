@@ -9,12 +9,12 @@ __version__ = "1.0.0"
 __author__ = "Hybrid RAG System"
 __description__ = "AI Agent with Vector Search and Knowledge Graph Integration"
 
-from .agent import rag_agent, AgentDependencies
+from .agent import get_agent, AgentDependencies
 from .models import *
 from .config import config
 
 __all__ = [
-    "rag_agent",
+    "get_agent",
     "AgentDependencies", 
     "config",
 ]
@@ -4,7 +4,9 @@ Main Pydantic AI agent for the Hybrid RAG system
 
 import asyncio
 import logging
-from typing import Dict, Any, List, Optional, AsyncGenerator
+import time
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, NamedTuple, Optional, Tuple, AsyncGenerator
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -13,10 +15,11 @@ from pydantic_ai.models import Model
 
 from .config import config
 from .models import (
-    ChatRequest, ChatResponse, SearchRequest, SearchResponse,
+    ChatRequest, ChatResponse, SearchRequest, SearchResponse, SearchType,
     ChunkResult, GraphResult, ToolCall, StreamDelta
 )
-from .prompts import SYSTEM_PROMPT, format_system_prompt
+from .embeddings import SemanticCache, generate_embedding
+from .prompts import SYSTEM_PROMPT
 from .providers import get_llm_model
 from .tools import (
     vector_search_tool,
@@ -33,7 +36,38 @@ from .tools import (
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Tools registered on every agent instance
+_TOOLS = (
+    vector_search_tool,
+    graph_search_tool,
+    hybrid_search_tool,
+    document_retrieval_tool,
+    entity_relationships_tool,
+)
+
+# Conversations longer than this are scanned for tool calls in a worker thread
+TOOL_EXTRACTION_THREAD_THRESHOLD = 16
+
+# Number of session shards; must be a power of two so the index is a mask
+SESSION_SHARDS = 16
+
+# Default search preferences, built once from config and copied per request
+_DEFAULT_SEARCH_PREFERENCES = {
+    "use_vector": config.search.enable_vector_search,
+    "use_graph": config.search.enable_graph_search,
+    "use_hybrid": config.search.enable_hybrid_search,
+    "default_limit": config.search.default_limit
+}
+
+def _elapsed_ms(start_ns: int) -> float:
+    """Milliseconds elapsed since a time.perf_counter_ns() reading"""
+    return (time.perf_counter_ns() - start_ns) / 1_000_000
+
+def _ns_to_iso(ts_ns: int) -> str:
+    """Convert an epoch timestamp in nanoseconds to an ISO 8601 string"""
+    return datetime.fromtimestamp(ts_ns / 1_000_000_000).isoformat()
+
+@dataclass(slots=True)
 class AgentDependencies:
     """Dependencies for the agent"""
     session_id: str
@@ -43,12 +77,31 @@ class AgentDependencies:
     
     def __post_init__(self):
         if self.search_preferences is None:
-            self.search_preferences = {
-                "use_vector": config.search.enable_vector_search,
-                "use_graph": config.search.enable_graph_search,
-                "use_hybrid": config.search.enable_hybrid_search,
-                "default_limit": config.search.default_limit
-            }
+            self.search_preferences = _DEFAULT_SEARCH_PREFERENCES.copy()
+
+@dataclass(slots=True)
+class StoredMessage:
+    """Message held in a session buffer; timestamp is epoch nanoseconds"""
+    role: str
+    content: str
+    timestamp: int
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the dict shape returned by the history API"""
+        return {
+            "role": self.role,
+            "content": self.content,
+            "timestamp": _ns_to_iso(self.timestamp)
+        }
+
+class StreamEvent(NamedTuple):
+    """Internal streaming event; mirrors StreamDelta without validation cost"""
+    type: str
+    content: Optional[str] = None
+    tools: Optional[List[ToolCall]] = None
+    sources: Optional[List[Any]] = None
+    session_id: Optional[str] = None
+    error: Optional[str] = None
 
 class HybridRAGAgent:
     """Main agent class for the Hybrid RAG system"""
@@ -56,7 +109,49 @@ class HybridRAGAgent:
     def __init__(self):
         self.model = get_llm_model()
         self.agent = self._create_agent()
-        self.active_sessions: Dict[str, Dict[str, Any]] = {}
+        # Sessions are sharded by id; each shard is an LRU of sessions holding a
+        # bounded ring buffer of messages, guarded by its own lock so that
+        # different sessions update in parallel while one session serializes
+        self._shards: List[Tuple[OrderedDict[str, Dict[str, Any]], asyncio.Lock]] = [
+            (OrderedDict(), asyncio.Lock()) for _ in range(SESSION_SHARDS)
+        ]
+        self.max_sessions_per_shard = max(1, config.session.max_sessions // SESSION_SHARDS)
+        self.max_messages = config.session.max_messages
+        
+        # (session_id, normalized message) -> (stored at, response), LRU ordered
+        self._response_cache: OrderedDict[Tuple[str, str], Tuple[float, ChatResponse]] = OrderedDict()
+        self.response_cache_ttl = config.agent.response_cache_ttl
+        self.response_cache_size = config.agent.response_cache_size
+        
+        # Optional second tier matching paraphrased questions by embedding
+        self._semantic_cache: Optional[SemanticCache] = None
+        if config.agent.semantic_cache_threshold > 0 and self.response_cache_ttl > 0:
+            self._semantic_cache = SemanticCache(
+                threshold=config.agent.semantic_cache_threshold,
+                ttl_seconds=self.response_cache_ttl,
+                max_entries=self.response_cache_size,
+                quantization=config.agent.semantic_cache_quantization
+            )
+        
+        # Search type -> (tool input model, tool, request -> input kwargs);
+        # SearchType is a str Enum hashing by value, so "vector" finds the same entry
+        self._search_dispatch = {
+            SearchType.VECTOR: (
+                VectorSearchInput,
+                vector_search_tool,
+                lambda r: {"query": r.query, "limit": r.limit}
+            ),
+            SearchType.GRAPH: (
+                GraphSearchInput,
+                graph_search_tool,
+                lambda r: {"query": r.query, "depth": config.search.graph_depth}
+            ),
+            SearchType.HYBRID: (
+                HybridSearchInput,
+                hybrid_search_tool,
+                lambda r: {"query": r.query, "limit": r.limit, "vector_weight": 0.7, "graph_weight": 0.3}
+            ),
+        }
         
     def _create_agent(self) -> Agent:
         """Create the Pydantic AI agent with tools"""
@@ -69,11 +164,8 @@ class HybridRAGAgent:
         )
         
         # Register tools
-        agent.tool(vector_search_tool)
-        agent.tool(graph_search_tool)
-        agent.tool(hybrid_search_tool)
-        agent.tool(document_retrieval_tool)
-        agent.tool(entity_relationships_tool)
+        for tool in _TOOLS:
+            agent.tool(tool)
         
         return agent
     
@@ -83,13 +175,26 @@ class HybridRAGAgent:
         deps: AgentDependencies
     ) -> ChatResponse:
         """Process a chat request and return response"""
-        start_time = datetime.now()
+        start_time = time.perf_counter_ns()
         tools_used = []
         sources = []
         
         try:
             # Update session
-            self._update_session(deps.session_id, request.message, "user")
+            await self._update_session(deps.session_id, request.message, "user")
+            
+            # Replay a recent identical question in this session without the agent
+            cache_key = (deps.session_id, request.message.strip().lower())
+            cached = self._get_cached_response(cache_key)
+            query_vector = None
+            if cached is None and self._semantic_cache is not None:
+                query_vector, cached = await self._get_semantic_response(request.message, deps.session_id)
+            if cached is not None:
+                await self._update_session(deps.session_id, cached.message, "assistant")
+                return cached.model_copy(update={
+                    "response_time_ms": 0.0,
+                    "request_id": deps.request_id
+                })
             
             # Run the agent
             result = await self.agent.run(
@@ -102,15 +207,15 @@ class HybridRAGAgent:
             
             # Extract tool calls from result
             if hasattr(result, 'all_messages'):
-                tools_used = self._extract_tool_calls(result.all_messages())
+                tools_used = await self._extract_tool_calls_async(result.all_messages())
             
             # Update session with response
-            self._update_session(deps.session_id, response_text, "assistant")
+            await self._update_session(deps.session_id, response_text, "assistant")
             
             # Calculate response time
-            response_time = (datetime.now() - start_time).total_seconds() * 1000
+            response_time = _elapsed_ms(start_time)
             
-            return ChatResponse(
+            response = ChatResponse(
                 message=response_text,
                 session_id=deps.session_id,
                 tools_used=tools_used,
@@ -118,10 +223,15 @@ class HybridRAGAgent:
                 response_time_ms=response_time,
                 request_id=deps.request_id
             )
+            self._cache_response(cache_key, response)
+            if query_vector is not None:
+                self._semantic_cache.put(query_vector, response, deps.session_id)
+            
+            return response
             
         except Exception as error:
             logger.error(f"Chat error: {error}", exc_info=True)
-            response_time = (datetime.now() - start_time).total_seconds() * 1000
+            response_time = _elapsed_ms(start_time)
             
             return ChatResponse(
                 message=f"I apologize, but I encountered an error while processing your request: {str(error)}",
@@ -137,14 +247,14 @@ class HybridRAGAgent:
         self,
         request: ChatRequest,
         deps: AgentDependencies
-    ) -> AsyncGenerator[StreamDelta, None]:
+    ) -> AsyncGenerator[StreamEvent, None]:
         """Process a chat request with streaming response"""
         try:
             # Update session
-            self._update_session(deps.session_id, request.message, "user")
+            await self._update_session(deps.session_id, request.message, "user")
             
             # Yield session info
-            yield StreamDelta(
+            yield StreamEvent(
                 type="session",
                 session_id=deps.session_id
             )
@@ -163,40 +273,31 @@ class HybridRAGAgent:
                                 
                                 if isinstance(event, PartStartEvent) and event.part.part_kind == 'text':
                                     delta_content = event.part.content
-                                    yield StreamDelta(type="text", content=delta_content)
+                                    yield StreamEvent("text", delta_content)
                                     full_response += delta_content
                                 
                                 elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
                                     delta_content = event.delta.content
-                                    yield StreamDelta(type="text", content=delta_content)
+                                    yield StreamEvent("text", delta_content)
                                     full_response += delta_content
-                    
-                    elif self.agent.is_tool_call_node(node):
-                        # Handle tool calls
-                        tool_call = ToolCall(
-                            tool_name=node.tool_name,
-                            args=node.tool_args,
-                            execution_time_ms=0  # Will be updated after execution
-                        )
-                        tools_used.append(tool_call)
             
-            # Extract final tool calls
+            # Extract tool calls once from the completed run
             if hasattr(run, 'all_messages'):
-                tools_used = self._extract_tool_calls(run.all_messages())
+                tools_used = await self._extract_tool_calls_async(run.all_messages())
             
             # Yield tools used
             if tools_used:
-                yield StreamDelta(type="tools", tools=tools_used)
+                yield StreamEvent(type="tools", tools=tools_used)
             
             # Update session with response
-            self._update_session(deps.session_id, full_response, "assistant")
+            await self._update_session(deps.session_id, full_response, "assistant")
             
             # Yield end signal
-            yield StreamDelta(type="end")
+            yield StreamEvent(type="end")
             
         except Exception as error:
             logger.error(f"Streaming chat error: {error}", exc_info=True)
-            yield StreamDelta(
+            yield StreamEvent(
                 type="error",
                 error=f"I encountered an error while processing your request: {str(error)}"
             )
@@ -207,41 +308,20 @@ class HybridRAGAgent:
         deps: AgentDependencies
     ) -> SearchResponse:
         """Perform a search using the specified method"""
-        start_time = datetime.now()
+        start_time = time.perf_counter_ns()
         
         try:
-            if request.search_type == "vector":
-                results = await vector_search_tool(
-                    VectorSearchInput(
-                        query=request.query,
-                        limit=request.limit
-                    ),
-                    deps
-                )
-            elif request.search_type == "graph":
-                results = await graph_search_tool(
-                    GraphSearchInput(
-                        query=request.query,
-                        depth=config.search.graph_depth
-                    ),
-                    deps
-                )
-            elif request.search_type == "hybrid":
-                results = await hybrid_search_tool(
-                    HybridSearchInput(
-                        query=request.query,
-                        limit=request.limit,
-                        vector_weight=0.7,
-                        graph_weight=0.3
-                    ),
-                    deps
-                )
-            else:
+            handler = self._search_dispatch.get(request.search_type)
+            if handler is None:
                 raise ValueError(f"Unsupported search type: {request.search_type}")
             
-            search_time = (datetime.now() - start_time).total_seconds() * 1000
+            input_cls, tool, build_args = handler
+            results = await tool(input_cls(**build_args(request)))
             
-            return SearchResponse(
+            search_time = _elapsed_ms(start_time)
+            
+            # Every field comes from the validated request or the tools
+            return SearchResponse.model_construct(
                 query=request.query,
                 search_type=request.search_type,
                 results=results,
@@ -253,7 +333,7 @@ class HybridRAGAgent:
             
         except Exception as error:
             logger.error(f"Search error: {error}", exc_info=True)
-            search_time = (datetime.now() - start_time).total_seconds() * 1000
+            search_time = _elapsed_ms(start_time)
             
             return SearchResponse(
                 query=request.query,
@@ -266,64 +346,148 @@ class HybridRAGAgent:
                 success=False
             )
     
-    def _update_session(self, session_id: str, message: str, role: str):
+    def _get_cached_response(self, key: Tuple[str, str]) -> Optional[ChatResponse]:
+        """Get a cached chat response if it has not expired"""
+        entry = self._response_cache.get(key)
+        if entry is None:
+            return None
+        
+        stored_at, response = entry
+        if time.monotonic() - stored_at > self.response_cache_ttl:
+            del self._response_cache[key]
+            return None
+        
+        self._response_cache.move_to_end(key)
+        return response
+    
+    def _cache_response(self, key: Tuple[str, str], response: ChatResponse):
+        """Cache a successful chat response, evicting the least recently used"""
+        if self.response_cache_ttl <= 0:
+            return
+        
+        self._response_cache[key] = (time.monotonic(), response)
+        self._response_cache.move_to_end(key)
+        if len(self._response_cache) > self.response_cache_size:
+            self._response_cache.popitem(last=False)
+    
+    async def _get_semantic_response(
+        self,
+        message: str,
+        session_id: str
+    ) -> Tuple[Optional[List[float]], Optional[ChatResponse]]:
+        """Embed a question and look for an answer to a similar one"""
+        try:
+            query_vector = await generate_embedding(message)
+        except Exception as error:
+            logger.warning(f"Semantic cache lookup skipped: {error}")
+            return None, None
+        return query_vector, self._semantic_cache.get(query_vector, session_id)
+    
+    def _get_shard(self, session_id: str) -> Tuple[OrderedDict[str, Dict[str, Any]], asyncio.Lock]:
+        """Get the session shard responsible for a session id"""
+        return self._shards[hash(session_id) & (SESSION_SHARDS - 1)]
+    
+    @property
+    def active_session_count(self) -> int:
+        """Number of sessions currently held in memory"""
+        return sum(len(sessions) for sessions, _ in self._shards)
+    
+    async def _update_session(self, session_id: str, message: str, role: str):
         """Update session with new message"""
-        if session_id not in self.active_sessions:
-            self.active_sessions[session_id] = {
-                "messages": [],
-                "created_at": datetime.now(),
-                "updated_at": datetime.now()
-            }
+        # One wall-clock read per message; converted to ISO at the API boundary
+        ts = time.time_ns()
+        sessions, lock = self._get_shard(session_id)
         
-        self.active_sessions[session_id]["messages"].append({
-            "role": role,
-            "content": message,
-            "timestamp": datetime.now()
-        })
-        self.active_sessions[session_id]["updated_at"] = datetime.now()
+        async with lock:
+            session = sessions.get(session_id)
+            if session is None:
+                session = sessions[session_id] = {
+                    "messages": deque(maxlen=self.max_messages),
+                    "created_at": ts,
+                    "updated_at": ts
+                }
+                if len(sessions) > self.max_sessions_per_shard:
+                    sessions.popitem(last=False)
+            else:
+                sessions.move_to_end(session_id)
+            
+            session["messages"].append(StoredMessage(role, message, ts))
+            session["updated_at"] = ts
     
     def _extract_tool_calls(self, messages: List[Any]) -> List[ToolCall]:
         """Extract tool calls from agent messages"""
-        tool_calls = []
+        tool_call_cls = ToolCall
         
-        for message in messages:
-            if hasattr(message, 'tool_calls') and message.tool_calls:
-                for tool_call in message.tool_calls:
-                    tool_calls.append(ToolCall(
-                        tool_name=tool_call.function.name,
-                        args=tool_call.function.arguments,
-                        result_summary=None,  # Could be enhanced
-                        execution_time_ms=None
-                    ))
-        
-        return tool_calls
+        return [
+            tool_call_cls(
+                tool_name=tool_call.function.name,
+                args=tool_call.function.arguments,
+                result_summary=None,  # Could be enhanced
+                execution_time_ms=None
+            )
+            for message in messages
+            for tool_call in (getattr(message, 'tool_calls', None) or ())
+        ]
+    
+    async def _extract_tool_calls_async(self, messages: List[Any]) -> List[ToolCall]:
+        """Extract tool calls, off the event loop for long conversations"""
+        messages = list(messages)
+        if len(messages) > TOOL_EXTRACTION_THREAD_THRESHOLD:
+            return await asyncio.to_thread(self._extract_tool_calls, messages)
+        return self._extract_tool_calls(messages)
     
-    def get_session_history(self, session_id: str) -> List[Dict[str, Any]]:
+    async def get_session_history(self, session_id: str) -> List[Dict[str, Any]]:
         """Get session message history"""
-        if session_id in self.active_sessions:
-            return self.active_sessions[session_id]["messages"]
-        return []
+        sessions, lock = self._get_shard(session_id)
+        
+        async with lock:
+            session = sessions.get(session_id)
+            if session is None:
+                return []
+            messages = list(session["messages"])
+        
+        return [message.to_dict() for message in messages]
     
-    def clear_session(self, session_id: str) -> bool:
+    async def clear_session(self, session_id: str) -> bool:
         """Clear session history"""
-        if session_id in self.active_sessions:
-            del self.active_sessions[session_id]
-            return True
-        return False
+        sessions, lock = self._get_shard(session_id)
+        
+        for key in [key for key in self._response_cache if key[0] == session_id]:
+            del self._response_cache[key]
+        if self._semantic_cache is not None:
+            self._semantic_cache.discard_namespace(session_id)
+        
+        async with lock:
+            return sessions.pop(session_id, None) is not None
+
+# Per-process agent instance, created on first use so importing this module
+# does not build the LLM model before startup validation has run. The API
+# builds it during lifespan startup and serves it from app.state.
+_rag_agent: Optional[HybridRAGAgent] = None
+_rag_agent_lock = asyncio.Lock()
 
-# Global agent instance
-rag_agent = HybridRAGAgent()
+async def get_agent() -> HybridRAGAgent:
+    """Get the global agent instance, creating it on first call"""
+    global _rag_agent
+    if _rag_agent is None:
+        async with _rag_agent_lock:
+            if _rag_agent is None:
+                _rag_agent = HybridRAGAgent()
+    return _rag_agent
 
 # Convenience functions
 async def process_chat_request(request: ChatRequest, deps: AgentDependencies) -> ChatResponse:
     """Process a chat request"""
-    return await rag_agent.chat(request, deps)
+    agent = await get_agent()
+    return await agent.chat(request, deps)
 
 async def process_chat_stream(request: ChatRequest, deps: AgentDependencies) -> AsyncGenerator[StreamDelta, None]:
     """Process a streaming chat request"""
-    async for delta in rag_agent.chat_stream(request, deps):
-        yield delta
+    agent = await get_agent()
+    async for event in agent.chat_stream(request, deps):
+        yield StreamDelta(**event._asdict())
 
 async def process_search_request(request: SearchRequest, deps: AgentDependencies) -> SearchResponse:
     """Process a search request"""
-    return await rag_agent.search(request, deps)
+    agent = await get_agent()
+    return await agent.search(request, deps)
@@ -4,24 +4,29 @@ FastAPI application for the Hybrid RAG Agent
 
 import asyncio
 import logging
+import sys
+import time
+from collections import OrderedDict, deque
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator
+from datetime import datetime
+from typing import AsyncGenerator, AsyncIterator, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from sse_starlette.sse import EventSourceResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import orjson
 import uvicorn
 
 from .config import config, validate_config
 from .models import (
     ChatRequest, ChatResponse, SearchRequest, SearchResponse,
-    HealthStatus, AgentStatus, AgentCapability, StreamDelta
+    HealthStatus, AgentStatus, AgentCapability, ProcessingJob
 )
-from .agent import rag_agent, AgentDependencies, process_chat_request, process_search_request
+from .agent import HybridRAGAgent, get_agent, AgentDependencies, StreamEvent
 from .database import initialize_databases, close_databases, health_check
+from .embeddings import close_embedding_client, load_tokenizer
 from .providers import validate_model_config
-from ..ingestion.pipeline import process_pdf_file, validate_ingestion_pipeline
+from ..ingestion.pipeline import process_pdf_file, validate_ingestion_pipeline, close_ingestion_pipeline
 
 # Configure logging
 logging.basicConfig(
@@ -30,6 +35,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Monotonic reference point for reporting uptime
+_STARTED_AT = time.perf_counter()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
@@ -49,6 +57,14 @@ async def lifespan(app: FastAPI):
         await initialize_databases()
         logger.info("Databases initialized")
         
+        # Load the token-count encoding now rather than on the event loop mid-request
+        if await asyncio.to_thread(load_tokenizer):
+            logger.info("Tokenizer loaded")
+        
+        # Build the worker's agent once, ahead of the first request
+        app.state.agent = await get_agent()
+        logger.info("Agent initialized")
+        
         # Validate pipeline
         pipeline_status = await validate_ingestion_pipeline()
         logger.info(f"Pipeline validation: {pipeline_status}")
@@ -66,6 +82,8 @@ async def lifespan(app: FastAPI):
     try:
         await close_databases()
         logger.info("Databases closed")
+        await close_embedding_client()
+        close_ingestion_pipeline()
     except Exception as error:
         logger.error(f"Error during shutdown: {error}")
 
@@ -74,7 +92,8 @@ app = FastAPI(
     title="Hybrid RAG Agent API",
     description="AI Agent with Vector Search and Knowledge Graph Integration",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -86,6 +105,174 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pre-framed SSE event prefixes for streamed deltas
+_SSE_DELTA_PREFIX = b"event: delta\ndata: "
+_SSE_ERROR_PREFIX = b"event: error\ndata: "
+_SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+def _encode_sse(delta: StreamEvent, prefix: bytes = _SSE_DELTA_PREFIX) -> bytes:
+    """Encode a stream event as a complete SSE event, omitting unset fields"""
+    payload = {"type": delta.type}
+    if delta.content is not None:
+        payload["content"] = delta.content
+    if delta.session_id is not None:
+        payload["session_id"] = delta.session_id
+    if delta.error is not None:
+        payload["error"] = delta.error
+    if delta.tools is not None:
+        payload["tools"] = [tool.model_dump() for tool in delta.tools]
+    if delta.sources is not None:
+        payload["sources"] = [source.model_dump() for source in delta.sources]
+    return prefix + orjson.dumps(payload) + b"\n\n"
+
+# Consecutive text deltas are merged for up to this long (or this many
+# characters) before being written, so fast models do not emit one SSE frame
+# per token
+_COALESCE_WINDOW_SECONDS = 0.010
+_COALESCE_MAX_CHARS = 512
+
+async def _coalesce_text_deltas(
+    deltas: AsyncIterator[StreamEvent]
+) -> AsyncGenerator[StreamEvent, None]:
+    """Merge runs of text deltas; all other delta types pass through in order"""
+    loop = asyncio.get_running_loop()
+    iterator = deltas.__aiter__()
+    buffer: List[str] = []
+    buffered_chars = 0
+    deadline = 0.0
+    pending: Optional[asyncio.Future] = None
+    
+    def flush() -> StreamEvent:
+        nonlocal buffered_chars
+        merged = StreamEvent("text", "".join(buffer))
+        buffer.clear()
+        buffered_chars = 0
+        return merged
+    
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            
+            # Wait for the next delta only until the window closes; the
+            # pending read is kept (not cancelled) for the next iteration
+            if buffer:
+                done, _ = await asyncio.wait({pending}, timeout=max(0.0, deadline - loop.time()))
+                if not done:
+                    yield flush()
+                    continue
+            
+            try:
+                delta = await pending
+            except StopAsyncIteration:
+                break
+            finally:
+                pending = None
+            
+            if delta.type == "text" and delta.content:
+                if not buffer:
+                    deadline = loop.time() + _COALESCE_WINDOW_SECONDS
+                buffer.append(delta.content)
+                buffered_chars += len(delta.content)
+                if buffered_chars >= _COALESCE_MAX_CHARS:
+                    yield flush()
+                continue
+            
+            if buffer:
+                yield flush()
+            yield delta
+        
+        if buffer:
+            yield flush()
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+# Events buffered between the agent run and a slow SSE client; once full,
+# further text deltas are merged into the newest buffered one
+_STREAM_QUEUE_SIZE = 256
+
+async def _decouple_stream(
+    deltas: AsyncIterator[StreamEvent]
+) -> AsyncGenerator[StreamEvent, None]:
+    """Drain deltas in a producer task so a slow client never stalls the agent"""
+    queue: deque = deque()
+    ready = asyncio.Event()
+    finished = False
+    failure: Optional[BaseException] = None
+    
+    async def produce():
+        nonlocal finished, failure
+        try:
+            async for delta in deltas:
+                if (
+                    len(queue) >= _STREAM_QUEUE_SIZE
+                    and delta.type == "text"
+                    and queue[-1].type == "text"
+                ):
+                    tail = queue[-1]
+                    queue[-1] = tail._replace(content=(tail.content or "") + (delta.content or ""))
+                else:
+                    queue.append(delta)
+                ready.set()
+        except Exception as error:
+            failure = error
+        finally:
+            finished = True
+            ready.set()
+    
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            while queue:
+                yield queue.popleft()
+            if finished:
+                break
+            ready.clear()
+            await ready.wait()
+        
+        if failure is not None:
+            raise failure
+    finally:
+        producer.cancel()
+
+class HealthCache:
+    """Short-lived cache so health probes share one database round-trip"""
+    
+    def __init__(self, ttl_seconds: float = 2.0):
+        self.ttl_seconds = ttl_seconds
+        self._lock = asyncio.Lock()
+        self._cached: Optional[Tuple[float, Dict[str, bool]]] = None
+    
+    def _fresh(self) -> Optional[Dict[str, bool]]:
+        if self._cached and time.monotonic() - self._cached[0] < self.ttl_seconds:
+            return self._cached[1]
+        return None
+    
+    async def get(self) -> Dict[str, bool]:
+        """Return the cached health result, refreshing it when stale"""
+        result = self._fresh()
+        if result is not None:
+            return result
+        
+        async with self._lock:
+            # Another probe may have refreshed while we waited for the lock
+            result = self._fresh()
+            if result is None:
+                result = await health_check()
+                self._cached = (time.monotonic(), result)
+        return result
+
+health_cache = HealthCache()
+
+# Dependency to fetch the agent built during startup
+def get_rag_agent(request: Request) -> HybridRAGAgent:
+    """Get the agent instance stored on the application state"""
+    return request.app.state.agent
+
 # Dependency to create agent dependencies
 async def get_agent_deps(
     session_id: str = "default",
@@ -106,7 +293,7 @@ async def health_endpoint():
     """Health check endpoint"""
     try:
         # Check database connections
-        db_health = await health_check()
+        db_health = await health_cache.get()
         
         # Determine overall status
         all_healthy = all(db_health.values())
@@ -115,7 +302,7 @@ async def health_endpoint():
         return HealthStatus(
             status=status,
             version="1.0.0",
-            uptime_seconds=0.0,  # Could be enhanced with actual uptime
+            uptime_seconds=time.perf_counter() - _STARTED_AT,
             checks=db_health
         )
     except Exception as error:
@@ -123,10 +310,10 @@ async def health_endpoint():
         raise HTTPException(status_code=503, detail="Service unavailable")
 
 @app.get("/status", response_model=AgentStatus)
-async def status_endpoint():
+async def status_endpoint(agent: HybridRAGAgent = Depends(get_rag_agent)):
     """Get agent status and capabilities"""
     try:
-        db_health = await health_check()
+        db_health = await health_cache.get()
         
         capabilities = [
             AgentCapability.VECTOR_SEARCH,
@@ -145,9 +332,9 @@ async def status_endpoint():
             status="healthy" if all(db_health.values()) else "degraded",
             capabilities=capabilities,
             version="1.0.0",
-            uptime_seconds=0.0,
+            uptime_seconds=time.perf_counter() - _STARTED_AT,
             total_requests=0,  # Could be enhanced with actual metrics
-            active_sessions=len(rag_agent.active_sessions),
+            active_sessions=agent.active_session_count,
             database_connections=db_health
         )
     except Exception as error:
@@ -161,7 +348,8 @@ async def status_endpoint():
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(
     request: ChatRequest,
-    deps: AgentDependencies = Depends(get_agent_deps)
+    deps: AgentDependencies = Depends(get_agent_deps),
+    agent: HybridRAGAgent = Depends(get_rag_agent)
 ):
     """Process a chat request"""
     try:
@@ -172,7 +360,7 @@ async def chat_endpoint(
             deps.user_id = request.user_id
         
         # Process chat request
-        response = await process_chat_request(request, deps)
+        response = await agent.chat(request, deps)
         return response
         
     except Exception as error:
@@ -182,7 +370,8 @@ async def chat_endpoint(
 @app.post("/chat/stream")
 async def chat_stream_endpoint(
     request: ChatRequest,
-    deps: AgentDependencies = Depends(get_agent_deps)
+    deps: AgentDependencies = Depends(get_agent_deps),
+    agent: HybridRAGAgent = Depends(get_rag_agent)
 ):
     """Process a streaming chat request"""
     try:
@@ -194,30 +383,31 @@ async def chat_stream_endpoint(
         
         async def event_generator():
             try:
-                async for delta in rag_agent.chat_stream(request, deps):
-                    yield {
-                        "event": "delta",
-                        "data": delta.model_dump_json()
-                    }
+                async for delta in _coalesce_text_deltas(_decouple_stream(agent.chat_stream(request, deps))):
+                    yield _encode_sse(delta)
             except Exception as error:
                 logger.error(f"Streaming error: {error}")
-                error_delta = StreamDelta(type="error", error=str(error))
-                yield {
-                    "event": "error",
-                    "data": error_delta.model_dump_json()
-                }
+                error_delta = StreamEvent(type="error", error=str(error))
+                yield _encode_sse(error_delta, _SSE_ERROR_PREFIX)
         
-        return EventSourceResponse(event_generator())
+        return StreamingResponse(
+            event_generator(),
+            media_type="text/event-stream",
+            headers=_SSE_HEADERS
+        )
         
     except Exception as error:
         logger.error(f"Streaming chat request failed: {error}")
         raise HTTPException(status_code=500, detail=f"Streaming failed: {error}")
 
 @app.get("/chat/history/{session_id}")
-async def get_chat_history(session_id: str):
+async def get_chat_history(
+    session_id: str,
+    agent: HybridRAGAgent = Depends(get_rag_agent)
+):
     """Get chat history for a session"""
     try:
-        history = rag_agent.get_session_history(session_id)
+        history = await agent.get_session_history(session_id)
         return {
             "session_id": session_id,
             "messages": history,
@@ -228,10 +418,13 @@ async def get_chat_history(session_id: str):
         raise HTTPException(status_code=500, detail="Failed to get chat history")
 
 @app.delete("/chat/history/{session_id}")
-async def clear_chat_history(session_id: str):
+async def clear_chat_history(
+    session_id: str,
+    agent: HybridRAGAgent = Depends(get_rag_agent)
+):
     """Clear chat history for a session"""
     try:
-        success = rag_agent.clear_session(session_id)
+        success = await agent.clear_session(session_id)
         return {
             "session_id": session_id,
             "cleared": success
@@ -247,7 +440,8 @@ async def clear_chat_history(session_id: str):
 @app.post("/search", response_model=SearchResponse)
 async def search_endpoint(
     request: SearchRequest,
-    deps: AgentDependencies = Depends(get_agent_deps)
+    deps: AgentDependencies = Depends(get_agent_deps),
+    agent: HybridRAGAgent = Depends(get_rag_agent)
 ):
     """Perform a search using the specified method"""
     try:
@@ -258,7 +452,7 @@ async def search_endpoint(
             deps.user_id = request.user_id
         
         # Process search request
-        response = await process_search_request(request, deps)
+        response = await agent.search(request, deps)
         return response
         
     except Exception as error:
@@ -269,24 +463,72 @@ async def search_endpoint(
 # Document Processing Endpoints
 # ============================================================================
 
-@app.post("/process/pdf")
-async def process_pdf_endpoint(
+# Recent processing jobs, oldest evicted first once the cap is reached
+_MAX_PROCESSING_JOBS = 1000
+processing_jobs: "OrderedDict[str, ProcessingJob]" = OrderedDict()
+
+async def _run_processing_job(
+    job: ProcessingJob,
     file_path: str,
     filename: str,
     original_name: str
 ):
-    """Process a PDF file through the ingestion pipeline"""
+    """Run the ingestion pipeline for a queued job and record its outcome"""
+    job.status = "processing"
+    job.started_at = datetime.now()
+
+    def on_progress(message: str, progress: float):
+        job.progress = progress
+
     try:
         result = await process_pdf_file(
             file_path=file_path,
             filename=filename,
-            original_name=original_name
+            original_name=original_name,
+            progress_callback=on_progress
         )
-        return result
-        
+        job.document_id = result.document_id
+        job.result = result.model_dump()
+        job.status = "completed" if result.success else "failed"
+        job.error_message = result.error_message
+
     except Exception as error:
         logger.error(f"PDF processing failed: {error}")
-        raise HTTPException(status_code=500, detail=f"PDF processing failed: {error}")
+        job.status = "failed"
+        job.error_message = str(error)
+
+    finally:
+        job.completed_at = datetime.now()
+
+@app.post("/process/pdf", status_code=202)
+async def process_pdf_endpoint(
+    file_path: str,
+    filename: str,
+    original_name: str,
+    background_tasks: BackgroundTasks
+):
+    """Queue a PDF file for the ingestion pipeline"""
+    job = ProcessingJob(document_id="pending")
+    processing_jobs[job.job_id] = job
+    while len(processing_jobs) > _MAX_PROCESSING_JOBS:
+        processing_jobs.popitem(last=False)
+
+    background_tasks.add_task(
+        _run_processing_job,
+        job,
+        file_path=file_path,
+        filename=filename,
+        original_name=original_name
+    )
+    return {"job_id": job.job_id, "status": job.status}
+
+@app.get("/process/pdf/{job_id}", response_model=ProcessingJob)
+async def process_pdf_status_endpoint(job_id: str):
+    """Get the status of a PDF processing job"""
+    job = processing_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Processing job not found: {job_id}")
+    return job
 
 # ============================================================================
 # Configuration and Info Endpoints
@@ -314,6 +556,7 @@ async def info_endpoint():
             "chat_stream": "/chat/stream",
             "search": "/search",
             "process_pdf": "/process/pdf",
+            "process_pdf_status": "/process/pdf/{job_id}",
             "info": "/info"
         }
     }
@@ -347,6 +590,8 @@ if __name__ == "__main__":
         "agent.api:app",
         host=config.app.host,
         port=config.app.port,
+        loop="uvloop" if sys.platform != "win32" else "asyncio",
+        http="httptools",
         reload=config.app.debug,
         log_level=config.logging.level.lower()
     )
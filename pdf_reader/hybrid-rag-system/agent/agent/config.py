@@ -3,109 +3,214 @@ Configuration management for Hybrid RAG Agent
 """
 
 import os
-from typing import Optional, List, Dict, Any
+import re
+from functools import lru_cache, partial
+from typing import Optional, List, Dict, Any, Callable
 from dataclasses import dataclass, field
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Load .env for local development only; production deployments provide real
+# environment variables. The guard survives importlib.reload.
+_DOTENV_LOADED = globals().get("_DOTENV_LOADED", False)
+if (
+    not _DOTENV_LOADED
+    and os.getenv("SKIP_DOTENV") != "1"
+    and os.getenv("NODE_ENV") != "production"
+):
+    load_dotenv(override=False)
+    _DOTENV_LOADED = True
 
-@dataclass
+# Snapshot of the environment taken once at import; config defaults read from
+# here and memoize their cast values so rebuilding a config is cheap
+_ENV: Dict[str, str] = dict(os.environ)
+_CACHE: Dict[str, Any] = {}
+
+# Schemes accepted for service URLs
+_URL_RE = re.compile(r"^(?:https?|bolt)://")
+
+def _as_bool(value: str) -> bool:
+    return value.lower() in ("true", "1")
+
+def _as_list(value: str) -> tuple:
+    return tuple(value.split(","))
+
+def _env(key: str, default: str, cast: Callable[[str], Any] = str) -> Any:
+    """Read an environment variable from the snapshot, cast once and cached"""
+    try:
+        return _CACHE[key]
+    except KeyError:
+        value = _CACHE[key] = cast(_ENV.get(key, default))
+        return value
+
+def _from_env(key: str, default: str, cast: Callable[[str], Any] = str) -> Callable[[], Any]:
+    """Build a dataclass default_factory that reads key through _env"""
+    return partial(_env, key, default, cast)
+
+def _cors_origins() -> List[str]:
+    """Fresh list per config so callers may extend it safely"""
+    return list(_env("CORS_ORIGINS", "http://localhost:3000,http://localhost:8000", _as_list))
+
+def refresh_env_cache() -> None:
+    """Re-snapshot os.environ and drop cached values (for tests)"""
+    _ENV.clear()
+    _ENV.update(os.environ)
+    _CACHE.clear()
+
+@dataclass(slots=True)
 class DatabaseConfig:
     """Database configuration"""
-    qdrant_url: str = field(default_factory=lambda: os.getenv("QDRANT_URL", "http://localhost:6333"))
-    qdrant_collection: str = field(default_factory=lambda: os.getenv("QDRANT_COLLECTION_NAME", "hybrid_rag_documents"))
-    qdrant_timeout: int = field(default_factory=lambda: int(os.getenv("QDRANT_TIMEOUT", "30")))
+    qdrant_url: str = field(default_factory=_from_env("QDRANT_URL", "http://localhost:6333"))
+    qdrant_collection: str = field(default_factory=_from_env("QDRANT_COLLECTION_NAME", "hybrid_rag_documents"))
+    qdrant_timeout: int = field(default_factory=_from_env("QDRANT_TIMEOUT", "30", int))
+    qdrant_prefer_grpc: bool = field(default_factory=_from_env("QDRANT_PREFER_GRPC", "false", _as_bool))
+    qdrant_grpc_port: int = field(default_factory=_from_env("QDRANT_GRPC_PORT", "6334", int))
     
-    neo4j_uri: str = field(default_factory=lambda: os.getenv("NEO4J_URI", "bolt://localhost:7687"))
-    neo4j_user: str = field(default_factory=lambda: os.getenv("NEO4J_USER", "neo4j"))
-    neo4j_password: str = field(default_factory=lambda: os.getenv("NEO4J_PASSWORD", "password"))
+    neo4j_uri: str = field(default_factory=_from_env("NEO4J_URI", "bolt://localhost:7687"))
+    neo4j_user: str = field(default_factory=_from_env("NEO4J_USER", "neo4j"))
+    neo4j_password: str = field(default_factory=_from_env("NEO4J_PASSWORD", "password"))
+    graphiti_skip_index_build: bool = field(default_factory=_from_env("GRAPHITI_SKIP_INDEX_BUILD", "false", _as_bool))
 
-@dataclass
+@dataclass(slots=True)
 class LLMConfig:
     """LLM provider configuration"""
-    provider: str = field(default_factory=lambda: os.getenv("LLM_PROVIDER", "openai"))
-    base_url: str = field(default_factory=lambda: os.getenv("LLM_BASE_URL", "https://api.openai.com/v1"))
-    api_key: str = field(default_factory=lambda: os.getenv("LLM_API_KEY", ""))
-    model: str = field(default_factory=lambda: os.getenv("LLM_MODEL", "gpt-4o-mini"))
-    temperature: float = field(default_factory=lambda: float(os.getenv("LLM_TEMPERATURE", "0.1")))
-    max_tokens: int = field(default_factory=lambda: int(os.getenv("LLM_MAX_TOKENS", "4000")))
-
-@dataclass
+    provider: str = field(default_factory=_from_env("LLM_PROVIDER", "openai"))
+    base_url: str = field(default_factory=_from_env("LLM_BASE_URL", "https://api.openai.com/v1"))
+    api_key: str = field(default_factory=_from_env("LLM_API_KEY", ""))
+    model: str = field(default_factory=_from_env("LLM_MODEL", "gpt-4o-mini"))
+    temperature: float = field(default_factory=_from_env("LLM_TEMPERATURE", "0.1", float))
+    max_tokens: int = field(default_factory=_from_env("LLM_MAX_TOKENS", "4000", int))
+
+@dataclass(slots=True)
 class EmbeddingConfig:
     """Embedding configuration"""
-    provider: str = field(default_factory=lambda: os.getenv("EMBEDDING_PROVIDER", "openai"))
-    base_url: str = field(default_factory=lambda: os.getenv("EMBEDDING_BASE_URL", "https://api.openai.com/v1"))
-    api_key: str = field(default_factory=lambda: os.getenv("EMBEDDING_API_KEY", ""))
-    model: str = field(default_factory=lambda: os.getenv("EMBEDDING_MODEL", "text-embedding-3-small"))
-    dimensions: int = field(default_factory=lambda: int(os.getenv("EMBEDDING_DIMENSIONS", "1536")))
-    batch_size: int = field(default_factory=lambda: int(os.getenv("EMBEDDING_BATCH_SIZE", "100")))
-
-@dataclass
+    provider: str = field(default_factory=_from_env("EMBEDDING_PROVIDER", "openai"))
+    base_url: str = field(default_factory=_from_env("EMBEDDING_BASE_URL", "https://api.openai.com/v1"))
+    api_key: str = field(default_factory=_from_env("EMBEDDING_API_KEY", ""))
+    model: str = field(default_factory=_from_env("EMBEDDING_MODEL", "text-embedding-3-small"))
+    dimensions: int = field(default_factory=_from_env("EMBEDDING_DIMENSIONS", "1536", int))
+    batch_size: int = field(default_factory=_from_env("EMBEDDING_BATCH_SIZE", "100", int))
+    cache_size: int = field(default_factory=_from_env("EMBEDDING_CACHE_SIZE", "10000", int))
+    max_connections: int = field(default_factory=_from_env("EMBEDDING_MAX_CONNECTIONS", "200", int))
+    max_concurrency: int = field(default_factory=_from_env("EMBEDDING_MAX_CONCURRENCY", "8", int))
+    requests_per_minute: int = field(default_factory=_from_env("EMBEDDING_REQUESTS_PER_MINUTE", "3000", int))
+    tokens_per_minute: int = field(default_factory=_from_env("EMBEDDING_TOKENS_PER_MINUTE", "1000000", int))
+    disk_cache_path: str = field(default_factory=_from_env("EMBEDDING_DISK_CACHE_PATH", "./cache/embeddings.sqlite3"))
+    fuzzy_threshold: float = field(default_factory=_from_env("EMBEDDING_FUZZY_THRESHOLD", "0", float))
+
+@dataclass(slots=True)
 class ProcessingConfig:
     """Document processing configuration"""
-    chunk_size: int = field(default_factory=lambda: int(os.getenv("CHUNK_SIZE", "1000")))
-    chunk_overlap: int = field(default_factory=lambda: int(os.getenv("CHUNK_OVERLAP", "200")))
-    max_chunk_size: int = field(default_factory=lambda: int(os.getenv("MAX_CHUNK_SIZE", "2000")))
-    enable_ocr: bool = field(default_factory=lambda: os.getenv("ENABLE_OCR", "false").lower() == "true")
-    ocr_language: str = field(default_factory=lambda: os.getenv("OCR_LANGUAGE", "eng"))
+    chunk_size: int = field(default_factory=_from_env("CHUNK_SIZE", "1000", int))
+    chunk_overlap: int = field(default_factory=_from_env("CHUNK_OVERLAP", "200", int))
+    max_chunk_size: int = field(default_factory=_from_env("MAX_CHUNK_SIZE", "2000", int))
+    enable_ocr: bool = field(default_factory=_from_env("ENABLE_OCR", "false", _as_bool))
+    ocr_language: str = field(default_factory=_from_env("OCR_LANGUAGE", "eng"))
+    num_workers: int = field(default_factory=_from_env("PROCESSING_NUM_WORKERS", str(os.cpu_count() or 4), int))
 
-@dataclass
+@dataclass(slots=True)
 class AgentConfig:
     """Agent behavior configuration"""
-    max_iterations: int = field(default_factory=lambda: int(os.getenv("AGENT_MAX_ITERATIONS", "10")))
-    timeout: int = field(default_factory=lambda: int(os.getenv("AGENT_TIMEOUT", "300")))
-    temperature: float = field(default_factory=lambda: float(os.getenv("AGENT_TEMPERATURE", "0.1")))
+    max_iterations: int = field(default_factory=_from_env("AGENT_MAX_ITERATIONS", "10", int))
+    timeout: int = field(default_factory=_from_env("AGENT_TIMEOUT", "300", int))
+    temperature: float = field(default_factory=_from_env("AGENT_TEMPERATURE", "0.1", float))
+    response_cache_ttl: int = field(default_factory=_from_env("AGENT_RESPONSE_CACHE_TTL", "300", int))
+    response_cache_size: int = field(default_factory=_from_env("AGENT_RESPONSE_CACHE_SIZE", "1024", int))
+    semantic_cache_threshold: float = field(default_factory=_from_env("AGENT_SEMANTIC_CACHE_THRESHOLD", "0", float))
+    semantic_cache_quantization: str = field(default_factory=_from_env("AGENT_SEMANTIC_CACHE_QUANTIZATION", "none"))
 
-@dataclass
+@dataclass(slots=True)
 class SearchConfig:
     """Search configuration"""
-    default_limit: int = field(default_factory=lambda: int(os.getenv("DEFAULT_SEARCH_LIMIT", "10")))
-    vector_threshold: float = field(default_factory=lambda: float(os.getenv("VECTOR_SEARCH_THRESHOLD", "0.7")))
-    graph_depth: int = field(default_factory=lambda: int(os.getenv("GRAPH_SEARCH_DEPTH", "3")))
-    enable_vector_search: bool = field(default_factory=lambda: os.getenv("ENABLE_VECTOR_SEARCH", "true").lower() == "true")
-    enable_graph_search: bool = field(default_factory=lambda: os.getenv("ENABLE_GRAPH_SEARCH", "true").lower() == "true")
-    enable_hybrid_search: bool = field(default_factory=lambda: os.getenv("ENABLE_HYBRID_SEARCH", "true").lower() == "true")
-
-@dataclass
+    default_limit: int = field(default_factory=_from_env("DEFAULT_SEARCH_LIMIT", "10", int))
+    vector_threshold: float = field(default_factory=_from_env("VECTOR_SEARCH_THRESHOLD", "0.7", float))
+    graph_depth: int = field(default_factory=_from_env("GRAPH_SEARCH_DEPTH", "3", int))
+    enable_vector_search: bool = field(default_factory=_from_env("ENABLE_VECTOR_SEARCH", "true", _as_bool))
+    enable_graph_search: bool = field(default_factory=_from_env("ENABLE_GRAPH_SEARCH", "true", _as_bool))
+    enable_hybrid_search: bool = field(default_factory=_from_env("ENABLE_HYBRID_SEARCH", "true", _as_bool))
+
+@dataclass(slots=True)
+class SessionConfig:
+    """In-memory chat session configuration"""
+    max_sessions: int = field(default_factory=_from_env("SESSION_MAX_SESSIONS", "1000", int))
+    max_messages: int = field(default_factory=_from_env("SESSION_MAX_MESSAGES", "100", int))
+
+@dataclass(slots=True)
 class AppConfig:
     """Application configuration"""
     name: str = "Hybrid RAG Agent"
     version: str = "1.0.0"
-    environment: str = field(default_factory=lambda: os.getenv("NODE_ENV", "development"))
-    port: int = field(default_factory=lambda: int(os.getenv("APP_PORT", "8001")))
-    host: str = field(default_factory=lambda: os.getenv("APP_HOST", "0.0.0.0"))
-    debug: bool = field(default_factory=lambda: os.getenv("ENABLE_DEBUG_MODE", "false").lower() == "true")
+    environment: str = field(default_factory=_from_env("NODE_ENV", "development"))
+    port: int = field(default_factory=_from_env("APP_PORT", "8001", int))
+    host: str = field(default_factory=_from_env("APP_HOST", "0.0.0.0"))
+    debug: bool = field(default_factory=_from_env("ENABLE_DEBUG_MODE", "false", _as_bool))
 
-@dataclass
+@dataclass(slots=True)
 class LoggingConfig:
     """Logging configuration"""
-    level: str = field(default_factory=lambda: os.getenv("LOG_LEVEL", "info"))
-    format: str = field(default_factory=lambda: os.getenv("LOG_FORMAT", "json"))
-    enable_request_logging: bool = field(default_factory=lambda: os.getenv("ENABLE_REQUEST_LOGGING", "true").lower() == "true")
+    level: str = field(default_factory=_from_env("LOG_LEVEL", "info"))
+    format: str = field(default_factory=_from_env("LOG_FORMAT", "json"))
+    enable_request_logging: bool = field(default_factory=_from_env("ENABLE_REQUEST_LOGGING", "true", _as_bool))
 
-@dataclass
+@dataclass(slots=True)
 class SecurityConfig:
     """Security configuration"""
-    cors_origins: List[str] = field(default_factory=lambda: os.getenv("CORS_ORIGINS", "http://localhost:3000,http://localhost:8000").split(","))
-    rate_limit_window: int = field(default_factory=lambda: int(os.getenv("RATE_LIMIT_WINDOW", "900000")))
-    rate_limit_max_requests: int = field(default_factory=lambda: int(os.getenv("RATE_LIMIT_MAX_REQUESTS", "100")))
+    cors_origins: List[str] = field(default_factory=_cors_origins)
+    rate_limit_window: int = field(default_factory=_from_env("RATE_LIMIT_WINDOW", "900000", int))
+    rate_limit_max_requests: int = field(default_factory=_from_env("RATE_LIMIT_MAX_REQUESTS", "100", int))
 
-@dataclass
 class HybridRAGConfig:
-    """Main configuration class"""
-    app: AppConfig = field(default_factory=AppConfig)
-    database: DatabaseConfig = field(default_factory=DatabaseConfig)
-    llm: LLMConfig = field(default_factory=LLMConfig)
-    embedding: EmbeddingConfig = field(default_factory=EmbeddingConfig)
-    processing: ProcessingConfig = field(default_factory=ProcessingConfig)
-    agent: AgentConfig = field(default_factory=AgentConfig)
-    search: SearchConfig = field(default_factory=SearchConfig)
-    logging: LoggingConfig = field(default_factory=LoggingConfig)
-    security: SecurityConfig = field(default_factory=SecurityConfig)
+    """Main configuration class; each section is built on first access"""
+    app: AppConfig
+    database: DatabaseConfig
+    llm: LLMConfig
+    embedding: EmbeddingConfig
+    processing: ProcessingConfig
+    agent: AgentConfig
+    search: SearchConfig
+    session: SessionConfig
+    logging: LoggingConfig
+    security: SecurityConfig
+
+    _FACTORIES = {
+        "app": AppConfig,
+        "database": DatabaseConfig,
+        "llm": LLMConfig,
+        "embedding": EmbeddingConfig,
+        "processing": ProcessingConfig,
+        "agent": AgentConfig,
+        "search": SearchConfig,
+        "session": SessionConfig,
+        "logging": LoggingConfig,
+        "security": SecurityConfig,
+    }
+
+    def __init__(self, **sections: Any):
+        unknown = sections.keys() - self._FACTORIES.keys()
+        if unknown:
+            raise TypeError(f"Unknown configuration sections: {', '.join(sorted(unknown))}")
+        self.__dict__.update(sections)
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called on a miss; the built section is stored in the instance
+        # dict so later lookups never come back here
+        factory = self._FACTORIES.get(name)
+        if factory is None:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        section = self.__dict__[name] = factory()
+        return section
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self) -> str:
+        built = ", ".join(f"{name}={value!r}" for name, value in self.__dict__.items())
+        return f"{type(self).__name__}({built})"
 
     def validate(self) -> None:
         """Validate configuration"""
+        for name in self._FACTORIES:
+            getattr(self, name)
+        
         required_fields = [
             (self.llm.api_key, "LLM_API_KEY"),
             (self.embedding.api_key, "EMBEDDING_API_KEY"),
@@ -126,8 +231,11 @@ class HybridRAGConfig:
         ]
         
         for url, field_name in urls_to_validate:
-            if not url.startswith(("http://", "https://", "bolt://")):
-                raise ValueError(f"Invalid URL format for {field_name}: {url}")
+            if not _URL_RE.match(url):
+                raise ValueError(
+                    f"Invalid URL format for {field_name}: {url} "
+                    "(expected http://, https:// or bolt://)"
+                )
 
     def get_llm_model_config(self) -> Dict[str, Any]:
         """Get LLM model configuration for Pydantic AI"""
@@ -176,27 +284,38 @@ def validate_config() -> None:
     """Validate global configuration"""
     config.validate()
 
-# Environment-specific configurations
+# Environment-specific configurations, each built once per process
+@lru_cache(maxsize=1)
 def get_development_config() -> HybridRAGConfig:
     """Get development configuration"""
-    dev_config = HybridRAGConfig()
-    dev_config.app.debug = True
-    dev_config.logging.level = "debug"
-    return dev_config
+    return HybridRAGConfig(
+        app=AppConfig(debug=True),
+        logging=LoggingConfig(level="debug"),
+    )
 
+@lru_cache(maxsize=1)
 def get_production_config() -> HybridRAGConfig:
     """Get production configuration"""
-    prod_config = HybridRAGConfig()
-    prod_config.app.debug = False
-    prod_config.logging.level = "warning"
-    prod_config.security.rate_limit_max_requests = 50
-    return prod_config
+    return HybridRAGConfig(
+        app=AppConfig(debug=False),
+        logging=LoggingConfig(level="warning"),
+        security=SecurityConfig(rate_limit_max_requests=50),
+    )
 
+@lru_cache(maxsize=1)
 def get_test_config() -> HybridRAGConfig:
     """Get test configuration"""
-    test_config = HybridRAGConfig()
-    test_config.app.debug = True
-    test_config.logging.level = "error"
-    test_config.database.qdrant_url = "http://localhost:6333"
-    test_config.database.neo4j_uri = "bolt://localhost:7687"
-    return test_config
+    return HybridRAGConfig(
+        app=AppConfig(debug=True),
+        logging=LoggingConfig(level="error"),
+        database=DatabaseConfig(
+            qdrant_url="http://localhost:6333",
+            neo4j_uri="bolt://localhost:7687",
+        ),
+    )
+
+def reset_config_cache() -> None:
+    """Drop the memoized environment-specific configurations (for tests)"""
+    get_development_config.cache_clear()
+    get_production_config.cache_clear()
+    get_test_config.cache_clear()
@@ -4,14 +4,16 @@ Database utilities for Qdrant vector store and Neo4j knowledge graph
 
 import asyncio
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from functools import lru_cache
+from itertools import islice
+from typing import List, Dict, Any, FrozenSet, Iterator, Optional, Tuple, Union
 from datetime import datetime
 import uuid
 
-from qdrant_client import QdrantClient
+from qdrant_client import AsyncQdrantClient
 from qdrant_client.models import (
     Distance, VectorParams, PointStruct, Filter, FieldCondition, 
-    MatchValue, SearchRequest, CollectionInfo
+    MatchValue, MatchAny, SearchRequest, CollectionInfo
 )
 from qdrant_client.http.exceptions import UnexpectedResponse
 
@@ -29,20 +31,114 @@ logger = logging.getLogger(__name__)
 # Qdrant Vector Store
 # ============================================================================
 
+def _make_filter(items) -> Filter:
+    """Build a Qdrant filter matching every (key, value) pair"""
+    return Filter(must=[
+        FieldCondition(key=key, match=MatchValue(value=value))
+        for key, value in items
+    ])
+
+# gRPC keepalive pings stop idle channels being dropped by load balancers
+_GRPC_OPTIONS = {"grpc.keepalive_time_ms": 30000}
+
+# Shared clients by endpoint settings; only close_databases closes them
+_qdrant_clients: Dict[Tuple[str, int, bool, int], AsyncQdrantClient] = {}
+
+def _shared_qdrant_client(
+    url: str,
+    timeout: int,
+    prefer_grpc: bool = False,
+    grpc_port: int = 6334
+) -> AsyncQdrantClient:
+    """One client (and connection pool) per Qdrant endpoint per process"""
+    key = (url, timeout, prefer_grpc, grpc_port)
+    client = _qdrant_clients.get(key)
+    if client is None:
+        if prefer_grpc:
+            client = AsyncQdrantClient(
+                url=url,
+                timeout=timeout,
+                prefer_grpc=True,
+                grpc_port=grpc_port,
+                grpc_options=_GRPC_OPTIONS
+            )
+        else:
+            client = AsyncQdrantClient(url=url, timeout=timeout)
+        _qdrant_clients[key] = client
+    return client
+
+async def _close_shared_qdrant_clients():
+    """Close every shared Qdrant client and forget them"""
+    clients = list(_qdrant_clients.values())
+    _qdrant_clients.clear()
+    for client in clients:
+        await client.close()
+
+def _document_filter(*document_ids: str) -> Filter:
+    """Build a filter matching the chunks of one or more documents"""
+    if len(document_ids) == 1:
+        match = MatchValue(value=document_ids[0])
+    else:
+        match = MatchAny(any=list(document_ids))
+    return Filter(must=[FieldCondition(key="document_id", match=match)])
+
+def _to_chunk_result(point_id: Any, payload: Dict[str, Any], score: float) -> ChunkResult:
+    """Build a ChunkResult from a stored point; payloads are written by
+    add_documents, so they are trusted and skip validation"""
+    # Qdrant returns UUID ids hyphenated; match DocumentChunk.chunk_id's hex form
+    if isinstance(point_id, str):
+        point_id = uuid.UUID(point_id).hex
+    return ChunkResult.model_construct(
+        chunk_id=str(point_id),
+        document_id=payload.get("document_id", ""),
+        content=payload.get("content", ""),
+        score=score,
+        metadata=payload.get("metadata", {}),
+        document_title=payload.get("document_title"),
+        document_source=payload.get("document_source"),
+        chunk_index=payload.get("chunk_index")
+    )
+
+@lru_cache(maxsize=256)
+def _cached_filter(items: FrozenSet[Tuple[str, Any]]) -> Filter:
+    """Memoized _make_filter for the repeated filter shapes searches use"""
+    return _make_filter(items)
+
 class QdrantVectorStore:
     """Qdrant vector database client"""
     
     def __init__(self):
-        self.client: Optional[QdrantClient] = None
+        self.client: Optional[AsyncQdrantClient] = None
         self.collection_name = config.database.qdrant_collection
         self.embedding_dim = config.embedding.dimensions
         
+        # Set once initialization has succeeded; the lock makes concurrent
+        # first callers share a single initialization
+        self._init_event = asyncio.Event()
+        self._init_lock = asyncio.Lock()
+        
+    async def _ensure_initialized(self):
+        """Initialize on first use; a no-op once initialized"""
+        if not self._init_event.is_set():
+            await self.initialize()
+    
     async def initialize(self):
         """Initialize Qdrant client and collection"""
+        if self._init_event.is_set():
+            return
+        
+        async with self._init_lock:
+            if not self._init_event.is_set():
+                await self._initialize()
+                self._init_event.set()
+    
+    async def _initialize(self):
         try:
-            self.client = QdrantClient(
-                url=config.database.qdrant_url,
-                timeout=config.database.qdrant_timeout
+            self.client = _shared_qdrant_client(
+                config.database.qdrant_url,
+                config.database.qdrant_timeout,
+                config.database.qdrant_prefer_grpc,
+                config.database.qdrant_grpc_port
             )
             
             # Create collection if it doesn't exist
@@ -54,16 +150,27 @@ class QdrantVectorStore:
             logger.error(f"Failed to initialize Qdrant: {error}")
             raise
     
+    async def _collection_exists(self) -> bool:
+        """Check for the collection with a single targeted request"""
+        try:
+            return await self.client.collection_exists(self.collection_name)
+        except UnexpectedResponse:
+            # Servers older than 1.8 have no exists endpoint; a missing
+            # collection makes get_collection fail instead
+            try:
+                await self.client.get_collection(self.collection_name)
+                return True
+            except UnexpectedResponse as error:
+                if error.status_code == 404:
+                    return False
+                raise
+    
     async def _ensure_collection_exists(self):
         """Ensure the collection exists with proper configuration"""
         try:
-            # Check if collection exists
-            collections = self.client.get_collections()
-            collection_names = [col.name for col in collections.collections]
-            
-            if self.collection_name not in collection_names:
+            if not await self._collection_exists():
                 # Create collection
-                self.client.create_collection(
+                await self.client.create_collection(
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(
                         size=self.embedding_dim,
@@ -80,37 +187,62 @@ class QdrantVectorStore:
     
     async def add_documents(self, chunks: List[DocumentChunk]) -> bool:
         """Add document chunks to the vector store"""
-        if not self.client:
-            await self.initialize()
+        await self._ensure_initialized()
         
         try:
-            points = []
-            for chunk in chunks:
-                if not chunk.embedding:
-                    logger.warning(f"Chunk {chunk.chunk_id} has no embedding, skipping")
-                    continue
-                
-                point = PointStruct(
-                    id=chunk.chunk_id,
-                    vector=chunk.embedding,
-                    payload={
+            created_at = datetime.now().isoformat()
+            skipped = 0
+            
+            def iter_points() -> Iterator[PointStruct]:
+                # Validation and point construction in one lazy pass
+                nonlocal skipped
+                for chunk in chunks:
+                    vector = chunk.embedding
+                    if vector is None or len(vector) == 0:
+                        skipped += 1
+                        continue
+                    # Ingestion keeps float16 arrays; decode at the write boundary
+                    if not isinstance(vector, list):
+                        vector = vector.tolist()
+                    
+                    payload = {
                         "document_id": chunk.document_id,
                         "content": chunk.content,
                         "chunk_index": chunk.chunk_index,
                         "start_char": chunk.start_char,
                         "end_char": chunk.end_char,
-                        "metadata": chunk.metadata,
-                        "created_at": datetime.now().isoformat(),
+                        "created_at": created_at,
                     }
-                )
-                points.append(point)
+                    # Readers default a missing metadata key to {}
+                    if chunk.metadata:
+                        payload["metadata"] = chunk.metadata
+                    
+                    yield PointStruct(
+                        id=chunk.chunk_id,
+                        vector=vector,
+                        payload=payload
+                    )
             
-            if points:
-                self.client.upsert(
+            # Upsert in fixed-size batches so only one batch of points is
+            # resident and serialized at a time
+            batch_size = config.embedding.batch_size
+            points = iter_points()
+            added = 0
+            batches = 0
+            
+            while batch := list(islice(points, batch_size)):
+                await self.client.upsert(
                     collection_name=self.collection_name,
-                    points=points
+                    points=batch
                 )
-                logger.info(f"Added {len(points)} chunks to Qdrant")
+                added += len(batch)
+                batches += 1
+            
+            if skipped:
+                logger.warning("Skipped %d chunks without embeddings", skipped)
+            
+            if added:
+                logger.info(f"Added {added} chunks to Qdrant in {batches} batches")
                 return True
             else:
                 logger.warning("No valid chunks to add to Qdrant")
@@ -124,30 +256,25 @@ class QdrantVectorStore:
         self,
         query_vector: List[float],
         limit: int = 10,
-        filters: Optional[Dict[str, Any]] = None,
+        filters: Union[Dict[str, Any], FrozenSet[Tuple[str, Any]], None] = None,
         score_threshold: Optional[float] = None
     ) -> List[ChunkResult]:
-        """Search for similar vectors"""
-        if not self.client:
-            await self.initialize()
+        """Search for similar vectors; filters may be a dict or a frozenset of its items"""
+        await self._ensure_initialized()
         
         try:
             # Build filter if provided
             search_filter = None
             if filters:
-                conditions = []
-                for key, value in filters.items():
-                    conditions.append(
-                        FieldCondition(
-                            key=key,
-                            match=MatchValue(value=value)
-                        )
-                    )
-                if conditions:
-                    search_filter = Filter(must=conditions)
+                try:
+                    items = filters if isinstance(filters, frozenset) else frozenset(filters.items())
+                    search_filter = _cached_filter(items)
+                except TypeError:
+                    # Unhashable filter values cannot be cached
+                    search_filter = _make_filter(filters.items())
             
             # Perform search
-            search_result = self.client.search(
+            search_result = await self.client.search(
                 collection_name=self.collection_name,
                 query_vector=query_vector,
                 limit=limit,
@@ -157,44 +284,53 @@ class QdrantVectorStore:
             )
             
             # Convert to ChunkResult objects
-            results = []
-            for hit in search_result:
-                payload = hit.payload
-                result = ChunkResult(
-                    chunk_id=str(hit.id),
-                    document_id=payload.get("document_id", ""),
-                    content=payload.get("content", ""),
-                    score=hit.score,
-                    metadata=payload.get("metadata", {}),
-                    document_title=payload.get("document_title"),
-                    document_source=payload.get("document_source"),
-                    chunk_index=payload.get("chunk_index")
-                )
-                results.append(result)
+            results = [_to_chunk_result(hit.id, hit.payload, hit.score) for hit in search_result]
             
-            logger.debug(f"Qdrant search returned {len(results)} results")
+            logger.debug("Qdrant search returned %d results", len(results))
             return results
             
         except Exception as error:
             logger.error(f"Qdrant search failed: {error}")
             return []
     
+    async def get_chunks_by_document_id(self, document_id: str, page_size: int = 256) -> List[ChunkResult]:
+        """Get every chunk of a document in chunk order, by filter rather than similarity"""
+        await self._ensure_initialized()
+        
+        try:
+            chunks = []
+            offset = None
+            while True:
+                points, offset = await self.client.scroll(
+                    collection_name=self.collection_name,
+                    scroll_filter=_document_filter(document_id),
+                    limit=page_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=False
+                )
+                # Listed chunks are exact matches, not ranked hits
+                chunks.extend(_to_chunk_result(point.id, point.payload, 1.0) for point in points)
+                if offset is None:
+                    break
+            
+            # Scroll returns points in id order; ordering by chunk_index on
+            # the server would need a payload range index
+            chunks.sort(key=lambda chunk: chunk.chunk_index or 0)
+            return chunks
+            
+        except Exception as error:
+            logger.error(f"Failed to list chunks for document {document_id}: {error}")
+            return []
+    
     async def delete_document(self, document_id: str) -> bool:
         """Delete all chunks for a document"""
-        if not self.client:
-            await self.initialize()
+        await self._ensure_initialized()
         
         try:
-            self.client.delete(
+            await self.client.delete(
                 collection_name=self.collection_name,
-                points_selector=Filter(
-                    must=[
-                        FieldCondition(
-                            key="document_id",
-                            match=MatchValue(value=document_id)
-                        )
-                    ]
-                )
+                points_selector=_document_filter(document_id)
             )
             logger.info(f"Deleted document {document_id} from Qdrant")
             return True
@@ -203,13 +339,31 @@ class QdrantVectorStore:
             logger.error(f"Failed to delete document from Qdrant: {error}")
             return False
     
+    async def delete_documents(self, document_ids: List[str]) -> bool:
+        """Delete all chunks for several documents in a single request"""
+        if not document_ids:
+            return True
+        
+        await self._ensure_initialized()
+        
+        try:
+            await self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=_document_filter(*document_ids)
+            )
+            logger.info(f"Deleted {len(document_ids)} documents from Qdrant")
+            return True
+            
+        except Exception as error:
+            logger.error(f"Failed to delete documents from Qdrant: {error}")
+            return False
+    
     async def get_collection_info(self) -> Dict[str, Any]:
         """Get collection information"""
-        if not self.client:
-            await self.initialize()
+        await self._ensure_initialized()
         
         try:
-            info = self.client.get_collection(self.collection_name)
+            info = await self.client.get_collection(self.collection_name)
             return {
                 "name": info.config.name,
                 "status": info.status,
@@ -223,10 +377,9 @@ class QdrantVectorStore:
             return {}
     
     async def close(self):
-        """Close the Qdrant client"""
-        if self.client:
-            self.client.close()
-            logger.info("Qdrant client closed")
+        """Release the shared Qdrant client; close_databases closes it"""
+        self._init_event.clear()
+        self.client = None
 
 # ============================================================================
 # Neo4j Knowledge Graph
@@ -239,8 +392,25 @@ class Neo4jKnowledgeGraph:
         self.driver = None
         self.graphiti: Optional[Graphiti] = None
         
+        self._init_event = asyncio.Event()
+        self._init_lock = asyncio.Lock()
+        
+    async def _ensure_initialized(self):
+        """Initialize on first use; a no-op once initialized"""
+        if not self._init_event.is_set():
+            await self.initialize()
+    
     async def initialize(self):
         """Initialize Neo4j driver and Graphiti"""
+        if self._init_event.is_set():
+            return
+        
+        async with self._init_lock:
+            if not self._init_event.is_set():
+                await self._initialize()
+                self._init_event.set()
+    
+    async def _initialize(self):
         try:
             # Initialize Neo4j driver
             self.driver = AsyncGraphDatabase.driver(
@@ -292,8 +462,11 @@ class Neo4jKnowledgeGraph:
                 embedder=embedder
             )
             
-            # Build indices and constraints
-            await self.graphiti.build_indices_and_constraints()
+            # Build indices and constraints, unless a deploy step already has
+            if config.database.graphiti_skip_index_build:
+                logger.info("Skipping Graphiti index build (GRAPHITI_SKIP_INDEX_BUILD is set)")
+            else:
+                await self.graphiti.build_indices_and_constraints()
             
             logger.info("Graphiti initialized successfully")
             
@@ -309,12 +482,11 @@ class Neo4jKnowledgeGraph:
         metadata: Optional[Dict[str, Any]] = None
     ) -> str:
         """Add content to the knowledge graph as an episode"""
-        if not self.graphiti:
-            await self.initialize()
+        await self._ensure_initialized()
         
         try:
             if not episode_id:
-                episode_id = f"episode_{uuid.uuid4()}"
+                episode_id = "episode_" + uuid.uuid4().hex
             
             await self.graphiti.add_episode(
                 episode_id=episode_id,
@@ -323,7 +495,7 @@ class Neo4jKnowledgeGraph:
                 metadata=metadata or {}
             )
             
-            logger.debug(f"Added episode to knowledge graph: {episode_id}")
+            logger.debug("Added episode to knowledge graph: %s", episode_id)
             return episode_id
             
         except Exception as error:
@@ -336,18 +508,20 @@ class Neo4jKnowledgeGraph:
         limit: Optional[int] = None
     ) -> List[GraphResult]:
         """Search the knowledge graph"""
-        if not self.graphiti:
-            await self.initialize()
+        await self._ensure_initialized()
         
         try:
             # Use Graphiti search
             results = await self.graphiti.search(query)
             
             # Convert to GraphResult objects
+            # A fallback id is generated only for results that lack one
+            uuid4 = uuid.uuid4
             graph_results = []
             for result in results:
+                entity_id = result.get("id")
                 graph_result = GraphResult(
-                    entity_id=result.get("id", str(uuid.uuid4())),
+                    entity_id=entity_id if entity_id is not None else uuid4().hex,
                     entity_name=result.get("name", "Unknown"),
                     entity_type=result.get("type", "Entity"),
                     relationships=result.get("relationships", []),
@@ -356,7 +530,7 @@ class Neo4jKnowledgeGraph:
                 )
                 graph_results.append(graph_result)
             
-            logger.debug(f"Knowledge graph search returned {len(graph_results)} results")
+            logger.debug("Knowledge graph search returned %d results", len(graph_results))
             return graph_results
             
         except Exception as error:
@@ -368,8 +542,7 @@ class Neo4jKnowledgeGraph:
         entity_name: str
     ) -> List[Dict[str, Any]]:
         """Get relationships for a specific entity"""
-        if not self.graphiti:
-            await self.initialize()
+        await self._ensure_initialized()
         
         try:
             # Use Graphiti to get entity relationships
@@ -380,8 +553,17 @@ class Neo4jKnowledgeGraph:
             logger.error(f"Failed to get entity relationships: {error}")
             return []
     
+    async def verify_connectivity(self) -> bool:
+        """Verify the driver can reach Neo4j"""
+        if not self.driver:
+            return False
+        
+        await self.driver.verify_connectivity()
+        return True
+    
     async def close(self):
         """Close Neo4j connections"""
+        self._init_event.clear()
         if self.graphiti:
             await self.graphiti.close()
         
@@ -400,38 +582,60 @@ knowledge_graph = Neo4jKnowledgeGraph()
 
 async def initialize_databases():
     """Initialize all database connections"""
-    await vector_store.initialize()
-    await knowledge_graph.initialize()
+    # The stores are independent, so connect to both concurrently
+    await asyncio.gather(vector_store.initialize(), knowledge_graph.initialize())
     logger.info("All databases initialized")
 
 async def close_databases():
     """Close all database connections"""
-    await vector_store.close()
-    await knowledge_graph.close()
+    results = await asyncio.gather(
+        vector_store.close(),
+        knowledge_graph.close(),
+        return_exceptions=True
+    )
+    for name, result in zip(("Qdrant", "Neo4j"), results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to close {name}: {result}")
+    
+    try:
+        await _close_shared_qdrant_clients()
+        logger.info("Qdrant client closed")
+    except Exception as error:
+        logger.error(f"Failed to close Qdrant client: {error}")
     logger.info("All database connections closed")
 
-async def health_check() -> Dict[str, bool]:
-    """Check health of all database connections"""
-    health = {}
-    
+async def _check_qdrant() -> bool:
+    if not vector_store.client:
+        return False
+    return bool(await vector_store.get_collection_info())
+
+async def _probe(check) -> bool:
     try:
-        # Check Qdrant
-        if vector_store.client:
-            info = await vector_store.get_collection_info()
-            health["qdrant"] = bool(info)
-        else:
-            health["qdrant"] = False
+        return bool(await check())
     except Exception:
-        health["qdrant"] = False
-    
+        return False
+
+async def health_check() -> Dict[str, bool]:
+    """Check health of all database connections"""
+    # Probe both stores concurrently; any probe error counts as unhealthy
+    qdrant, neo4j = await asyncio.gather(
+        _probe(_check_qdrant),
+        _probe(knowledge_graph.verify_connectivity)
+    )
+    return {
+        "qdrant": qdrant,
+        "neo4j": neo4j,
+    }
+
+async def build_graph_indices():
+    """Build Graphiti indices and constraints once, e.g. as a deploy step"""
+    await knowledge_graph.initialize()
     try:
-        # Check Neo4j
-        if knowledge_graph.driver:
-            await knowledge_graph.driver.verify_connectivity()
-            health["neo4j"] = True
-        else:
-            health["neo4j"] = False
-    except Exception:
-        health["neo4j"] = False
-    
-    return health
+        if config.database.graphiti_skip_index_build:
+            await knowledge_graph.graphiti.build_indices_and_constraints()
+        logger.info("Graphiti indices and constraints are up to date")
+    finally:
+        await knowledge_graph.close()
+
+if __name__ == "__main__":
+    asyncio.run(build_graph_indices())
@@ -3,20 +3,112 @@ Embedding generation utilities for the Hybrid RAG Agent
 """
 
 import asyncio
+import base64
 import logging
-from typing import List, Optional, Dict, Any
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property, lru_cache
+from hashlib import blake2b
+from itertools import islice
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple, Union
 import httpx
+import numpy as np
 import openai
+import orjson
 from openai import AsyncOpenAI
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+try:
+    import tiktoken
+except ImportError:  # Fall back to a characters-per-token estimate
+    tiktoken = None
 
 from .config import config
 
 logger = logging.getLogger(__name__)
 
+_WS_RE = re.compile(r"\s+")
+
+# Token counts kept for recently seen texts
+_TOKEN_COUNT_CACHE_SIZE = 10000
+# Larger batches are counted in a worker thread, off the event loop
+_TOKEN_COUNT_INLINE_TEXTS = 32
+
+@lru_cache(maxsize=1)
+def _get_tokenizer():
+    """Load the cl100k_base encoding once, or None when tiktoken is unavailable"""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as error:
+        logger.warning(f"Tokenizer unavailable, estimating token counts: {error}")
+        return None
+
+def load_tokenizer() -> bool:
+    """Load the tokenizer ahead of the first count; it may download its encoding"""
+    return _get_tokenizer() is not None
+
+# blake2b digest of text -> token count, LRU ordered; keyed by digest so the
+# cache does not keep the texts themselves alive
+_token_counts: "OrderedDict[bytes, int]" = OrderedDict()
+_token_counts_lock = threading.Lock()
+
+def count_tokens(text: str) -> int:
+    """Token count of text, cached so repeated chunks are only encoded once"""
+    key = blake2b(text.encode(), digest_size=16).digest()
+    with _token_counts_lock:
+        count = _token_counts.get(key)
+        if count is not None:
+            _token_counts.move_to_end(key)
+            return count
+    
+    tokenizer = _get_tokenizer()
+    if tokenizer is None:
+        # Rough estimate of about four characters per token
+        count = len(text) // 4 + 1
+    else:
+        count = len(tokenizer.encode(text, disallowed_special=()))
+    
+    with _token_counts_lock:
+        _token_counts[key] = count
+        if len(_token_counts) > _TOKEN_COUNT_CACHE_SIZE:
+            _token_counts.popitem(last=False)
+    return count
+
+def _count_batch_tokens(texts: List[str]) -> int:
+    """Total token count of texts"""
+    return sum(map(count_tokens, texts))
+
 class EmbeddingError(Exception):
     """Exception raised for embedding generation errors"""
     pass
 
+class TokenBucket:
+    """Async token bucket: bursts up to capacity, refilled at a steady rate"""
+    
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until the requested tokens are available, then take them"""
+        # A request larger than the bucket would never fit; let it drain it
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
 class EmbeddingGenerator:
     """Embedding generator with support for multiple providers"""
     
@@ -27,139 +119,276 @@ class EmbeddingGenerator:
         self.base_url = config.embedding.base_url
         self.dimensions = config.embedding.dimensions
         self.batch_size = config.embedding.batch_size
+        self.max_connections = config.embedding.max_connections
+        self.max_concurrency = config.embedding.max_concurrency
+        self._dimensions_verified = False
         
-        # Initialize client based on provider
-        self.client = self._initialize_client()
+        # Client-side quota limits, skipped when configured as 0
+        rpm = config.embedding.requests_per_minute
+        tpm = config.embedding.tokens_per_minute
+        self._request_limiter = TokenBucket(rpm) if rpm > 0 else None
+        self._token_limiter = TokenBucket(tpm) if tpm > 0 else None
+        
+        # blake2b digest of cleaned text -> embedding, LRU ordered
+        self.cache_size = config.embedding.cache_size
+        self._cache: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+    
+    @cached_property
+    def client(self) -> AsyncOpenAI:
+        """Embedding client, built on first use"""
+        return self._initialize_client()
     
     def _initialize_client(self) -> AsyncOpenAI:
         """Initialize the embedding client"""
         try:
+            # One pooled HTTP/2 connection set shared by every request
+            http_client = openai.DefaultAsyncHttpxClient(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=max(1, self.max_connections // 2)
+                )
+            )
+            
             if self.provider == "openai":
                 return AsyncOpenAI(
                     api_key=self.api_key,
-                    base_url=self.base_url if self.base_url != "https://api.openai.com/v1" else None
+                    base_url=self.base_url if self.base_url != "https://api.openai.com/v1" else None,
+                    http_client=http_client
                 )
             elif self.provider == "ollama":
                 return AsyncOpenAI(
                     api_key="ollama",  # Ollama doesn't require a real API key
-                    base_url=self.base_url
+                    base_url=self.base_url,
+                    http_client=http_client
                 )
             else:
                 # Generic OpenAI-compatible
                 return AsyncOpenAI(
                     api_key=self.api_key,
-                    base_url=self.base_url
+                    base_url=self.base_url,
+                    http_client=http_client
                 )
         except Exception as error:
             logger.error(f"Failed to initialize embedding client: {error}")
             raise EmbeddingError(f"Failed to initialize embedding client: {error}")
     
-    async def generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for a single text"""
+    async def generate_embedding(self, text: str) -> np.ndarray:
+        """Generate a float32 embedding for a single text"""
         try:
             # Clean and prepare text
             cleaned_text = self._clean_text(text)
             
-            if not cleaned_text.strip():
+            if not cleaned_text:
                 logger.warning("Empty text provided for embedding")
-                return [0.0] * self.dimensions
+                return np.zeros(self.dimensions, dtype=np.float32)
             
-            # Generate embedding
-            response = await self.client.embeddings.create(
-                model=self.model,
-                input=cleaned_text,
-                encoding_format="float"
-            )
+            cached = self._cache_get(cleaned_text)
+            if cached is not None:
+                return cached
             
-            embedding = response.data[0].embedding
+            # Concurrent misses for the same text share one API call; the
+            # shield keeps one caller's cancellation from failing the others
+            task = self._inflight.get(cleaned_text)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch_embedding(cleaned_text))
+                self._inflight[cleaned_text] = task
+                task.add_done_callback(lambda _: self._inflight.pop(cleaned_text, None))
+            return await asyncio.shield(task)
             
-            # Validate embedding dimensions
-            if len(embedding) != self.dimensions:
+        except Exception as error:
+            logger.error(f"Failed to generate embedding: {error}")
+            raise EmbeddingError(f"Failed to generate embedding: {error}")
+    
+    async def _fetch_embedding(self, cleaned_text: str) -> np.ndarray:
+        """Embed one cleaned text through the API and cache the result"""
+        embedding = (await self._create_embeddings(cleaned_text))[0]
+        
+        # Validate embedding dimensions until the provider returns the
+        # configured size once; after that it is trusted
+        if not self._dimensions_verified:
+            if len(embedding) == self.dimensions:
+                self._dimensions_verified = True
+            else:
                 logger.warning(
                     f"Embedding dimension mismatch: expected {self.dimensions}, "
                     f"got {len(embedding)}"
                 )
-            
-            return embedding
-            
-        except Exception as error:
-            logger.error(f"Failed to generate embedding: {error}")
-            raise EmbeddingError(f"Failed to generate embedding: {error}")
+        
+        self._cache_put(cleaned_text, embedding)
+        return embedding
     
     async def generate_embeddings_batch(
         self,
         texts: List[str],
         progress_callback: Optional[callable] = None
-    ) -> List[List[float]]:
-        """Generate embeddings for multiple texts in batches"""
+    ) -> np.ndarray:
+        """Generate a (len(texts), dimensions) float32 matrix of embeddings in batches"""
         try:
-            embeddings = []
             total_batches = (len(texts) + self.batch_size - 1) // self.batch_size
+            embeddings = np.empty((len(texts), self.dimensions), dtype=np.float32)
+            async for index, embedding in self.iter_embeddings(texts, progress_callback):
+                embeddings[index] = embedding
             
-            for i in range(0, len(texts), self.batch_size):
-                batch = texts[i:i + self.batch_size]
-                batch_num = i // self.batch_size + 1
-                
-                # Clean texts in batch
-                cleaned_batch = [self._clean_text(text) for text in batch]
-                
-                # Filter out empty texts
-                non_empty_batch = [text for text in cleaned_batch if text.strip()]
-                
-                if not non_empty_batch:
-                    # Add zero embeddings for empty batch
-                    embeddings.extend([[0.0] * self.dimensions] * len(batch))
-                    continue
+            logger.info(f"Generated {len(embeddings)} embeddings in {total_batches} batches")
+            return embeddings
+            
+        except Exception as error:
+            logger.error(f"Failed to generate batch embeddings: {error}")
+            raise EmbeddingError(f"Failed to generate batch embeddings: {error}")
+    
+    async def iter_embeddings(
+        self,
+        texts: List[str],
+        progress_callback: Optional[callable] = None
+    ) -> AsyncIterator[Tuple[int, np.ndarray]]:
+        """Yield (index, embedding) pairs batch by batch, in completion order"""
+        total_batches = (len(texts) + self.batch_size - 1) // self.batch_size
+        starts = iter(range(0, len(texts), self.batch_size))
+        pending = set()
+        completed = 0
+        
+        async def run_batch(start: int) -> Tuple[int, np.ndarray]:
+            batch = texts[start:start + self.batch_size]
+            # Rows start as zero vectors, which is what empty texts and
+            # failed requests are left with
+            rows = np.zeros((len(batch), self.dimensions), dtype=np.float32)
+            await self._embed_batch(batch, rows, start // self.batch_size + 1, total_batches)
+            return start, rows
+        
+        def schedule(count: int):
+            for start in islice(starts, count):
+                pending.add(asyncio.create_task(run_batch(start)))
+        
+        # At most max_concurrency batches are in flight, so memory stays
+        # O(batch_size * dimensions) however many texts there are
+        schedule(max(1, self.max_concurrency))
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+                schedule(len(done))
                 
-                try:
-                    # Generate embeddings for batch
-                    response = await self.client.embeddings.create(
-                        model=self.model,
-                        input=non_empty_batch,
-                        encoding_format="float"
-                    )
-                    
-                    # Extract embeddings
-                    batch_embeddings = [item.embedding for item in response.data]
-                    
-                    # Handle case where some texts were filtered out
-                    embedding_idx = 0
-                    for original_text, cleaned_text in zip(batch, cleaned_batch):
-                        if cleaned_text.strip():
-                            embeddings.append(batch_embeddings[embedding_idx])
-                            embedding_idx += 1
-                        else:
-                            embeddings.append([0.0] * self.dimensions)
-                    
-                    logger.debug(f"Generated embeddings for batch {batch_num}/{total_batches}")
+                for task in done:
+                    start, rows = task.result()
+                    completed += 1
                     
                     # Call progress callback if provided
                     if progress_callback:
-                        progress_callback(batch_num, total_batches)
+                        progress_callback(completed, total_batches)
                     
-                    # Small delay to avoid rate limiting
-                    if batch_num < total_batches:
-                        await asyncio.sleep(0.1)
-                
-                except Exception as batch_error:
-                    logger.error(f"Failed to generate embeddings for batch {batch_num}: {batch_error}")
-                    # Add zero embeddings for failed batch
-                    embeddings.extend([[0.0] * self.dimensions] * len(batch))
+                    for offset, embedding in enumerate(rows):
+                        yield start + offset, embedding
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def _embed_batch(
+        self,
+        batch: List[str],
+        rows: np.ndarray,
+        batch_num: int,
+        total_batches: int
+    ):
+        """Embed one batch into its rows, leaving them zero if the request fails"""
+        # Single pass: empty texts keep their zero rows, cached texts get their
+        # stored embedding, and the rest are grouped so each distinct text is
+        # sent once
+        to_fetch: Dict[str, List[int]] = {}
+        for idx, text in enumerate(batch):
+            cleaned_text = self._clean_text(text)
+            if not cleaned_text:
+                continue
+            elif cleaned_text in to_fetch:
+                to_fetch[cleaned_text].append(idx)
+            elif (cached := self._cache_get(cleaned_text)) is not None:
+                rows[idx] = cached
+            else:
+                to_fetch[cleaned_text] = [idx]
+        
+        if not to_fetch:
+            return
+        
+        try:
+            # Generate embeddings for batch
+            fetched = await self._create_embeddings(list(to_fetch))
             
-            logger.info(f"Generated {len(embeddings)} embeddings in {total_batches} batches")
-            return embeddings
+            for (cleaned_text, indices), embedding in zip(to_fetch.items(), fetched):
+                rows[indices] = embedding
+                self._cache_put(cleaned_text, embedding)
             
-        except Exception as error:
-            logger.error(f"Failed to generate batch embeddings: {error}")
-            raise EmbeddingError(f"Failed to generate batch embeddings: {error}")
+            logger.debug(f"Generated embeddings for batch {batch_num}/{total_batches}")
+        
+        except Exception as batch_error:
+            # The texts that failed keep their zero rows
+            logger.error(f"Failed to generate embeddings for batch {batch_num}: {batch_error}")
+    
+    @retry(
+        retry=retry_if_exception_type(openai.RateLimitError),
+        wait=wait_random_exponential(min=1, max=30),
+        stop=stop_after_attempt(3),
+        reraise=True
+    )
+    async def _create_embeddings(self, inputs: Union[str, List[str]]) -> List[np.ndarray]:
+        """Call the embeddings endpoint within the configured rate limits"""
+        if self._request_limiter:
+            await self._request_limiter.acquire()
+        if self._token_limiter:
+            texts = [inputs] if isinstance(inputs, str) else inputs
+            if len(texts) > _TOKEN_COUNT_INLINE_TEXTS:
+                tokens = await asyncio.to_thread(_count_batch_tokens, texts)
+            else:
+                tokens = _count_batch_tokens(texts)
+            await self._token_limiter.acquire(tokens)
+        
+        # Parse the raw body with orjson rather than building the SDK's
+        # response models over the stdlib json parser
+        response = await self.client.embeddings.with_raw_response.create(
+            model=self.model,
+            input=inputs,
+            encoding_format="base64"
+        )
+        data = orjson.loads(response.http_response.content)["data"]
+        data.sort(key=lambda item: item["index"])
+        return [self._decode_embedding(item["embedding"]) for item in data]
+    
+    @staticmethod
+    def _decode_embedding(embedding: Union[str, List[float]]) -> np.ndarray:
+        """Decode a base64 float32 buffer, or a float list from providers that ignore base64"""
+        if isinstance(embedding, str):
+            return np.frombuffer(base64.b64decode(embedding), dtype=np.float32)
+        return np.asarray(embedding, dtype=np.float32)
+    
+    def _cache_get(self, cleaned_text: str) -> Optional[np.ndarray]:
+        """Get the cached embedding for a cleaned text, refreshing its recency"""
+        key = blake2b(cleaned_text.encode(), digest_size=16).digest()
+        embedding = self._cache.get(key)
+        if embedding is not None:
+            self._cache.move_to_end(key)
+        return embedding
+    
+    def _cache_put(self, cleaned_text: str, embedding: np.ndarray):
+        """Cache an embedding, evicting the least recently used past cache_size"""
+        if self.cache_size <= 0:
+            return
+        
+        # Cached arrays are handed out as-is, so keep callers from mutating them
+        embedding.setflags(write=False)
+        key = blake2b(cleaned_text.encode(), digest_size=16).digest()
+        self._cache[key] = embedding
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
     
     def _clean_text(self, text: str) -> str:
         """Clean and prepare text for embedding"""
         if not text:
             return ""
         
-        # Remove excessive whitespace
-        cleaned = " ".join(text.split())
+        # Remove excessive whitespace in one regex pass, without splitting
+        # the text into a list of tokens first
+        cleaned = _WS_RE.sub(" ", text).strip()
         
         # Truncate if too long (most embedding models have token limits)
         max_chars = 8000  # Conservative limit
@@ -169,15 +398,24 @@ class EmbeddingGenerator:
         
         return cleaned
     
+    async def probe_dimensions(self) -> int:
+        """Embed a probe text straight through the API, bypassing the cache, and return its dimension"""
+        return len((await self._create_embeddings("test"))[0])
+    
     async def test_connection(self) -> bool:
         """Test the embedding service connection"""
         try:
-            test_embedding = await self.generate_embedding("test")
-            return len(test_embedding) == self.dimensions
+            return await self.probe_dimensions() == self.dimensions
         except Exception as error:
             logger.error(f"Embedding service test failed: {error}")
             return False
     
+    async def close(self):
+        """Close the embedding client and its connection pool"""
+        client = self.__dict__.pop("client", None)
+        if client is not None:
+            await client.close()
+    
     def get_info(self) -> Dict[str, Any]:
         """Get embedding service information"""
         return {
@@ -188,89 +426,265 @@ class EmbeddingGenerator:
             "base_url": self.base_url
         }
 
-# Global embedding generator instance
-embedding_generator = EmbeddingGenerator()
+# Global embedding generator instance, created on first use
+@lru_cache(maxsize=1)
+def get_embedding_generator() -> EmbeddingGenerator:
+    """Get the shared embedding generator"""
+    return EmbeddingGenerator()
 
 # Convenience functions
 async def generate_embedding(text: str) -> List[float]:
     """Generate embedding for a single text"""
-    return await embedding_generator.generate_embedding(text)
+    embedding = await get_embedding_generator().generate_embedding(text)
+    return embedding.tolist()
 
 async def generate_embeddings_batch(
     texts: List[str],
     progress_callback: Optional[callable] = None
 ) -> List[List[float]]:
     """Generate embeddings for multiple texts"""
-    return await embedding_generator.generate_embeddings_batch(texts, progress_callback)
+    embeddings = await get_embedding_generator().generate_embeddings_batch(texts, progress_callback)
+    return embeddings.tolist()
+
+async def iter_embeddings(
+    texts: List[str],
+    progress_callback: Optional[callable] = None
+) -> AsyncIterator[Tuple[int, List[float]]]:
+    """Yield (index, embedding) pairs for multiple texts as batches complete"""
+    async for index, embedding in get_embedding_generator().iter_embeddings(texts, progress_callback):
+        yield index, embedding.tolist()
+
+async def iter_embedding_vectors(
+    texts: List[str],
+    progress_callback: Optional[callable] = None,
+    dtype: np.dtype = np.float16
+) -> AsyncIterator[Tuple[int, np.ndarray]]:
+    """Yield (index, embedding) pairs as compact numpy vectors, by default float16"""
+    async for index, embedding in get_embedding_generator().iter_embeddings(texts, progress_callback):
+        yield index, embedding.astype(dtype)
 
 async def test_embedding_service() -> bool:
     """Test the embedding service"""
-    return await embedding_generator.test_connection()
+    return await get_embedding_generator().test_connection()
+
+async def close_embedding_client():
+    """Close the shared embedding client, if one was ever created"""
+    if get_embedding_generator.cache_info().currsize:
+        await get_embedding_generator().close()
 
 def get_embedding_info() -> Dict[str, Any]:
     """Get embedding service information"""
-    return embedding_generator.get_info()
+    return get_embedding_generator().get_info()
 
 # Embedding utilities
 def cosine_similarity(a: List[float], b: List[float]) -> float:
     """Calculate cosine similarity between two embeddings"""
-    try:
-        import math
-        
-        # Calculate dot product
-        dot_product = sum(x * y for x, y in zip(a, b))
-        
-        # Calculate magnitudes
-        magnitude_a = math.sqrt(sum(x * x for x in a))
-        magnitude_b = math.sqrt(sum(x * x for x in b))
-        
-        # Avoid division by zero
-        if magnitude_a == 0 or magnitude_b == 0:
-            return 0.0
-        
-        # Calculate cosine similarity
-        similarity = dot_product / (magnitude_a * magnitude_b)
-        return similarity
-        
-    except Exception as error:
-        logger.error(f"Failed to calculate cosine similarity: {error}")
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    
+    magnitude = np.linalg.norm(a) * np.linalg.norm(b)
+    
+    # Avoid division by zero
+    if magnitude == 0:
         return 0.0
+    
+    return float(a @ b / magnitude)
 
-def euclidean_distance(a: List[float], b: List[float]) -> float:
-    """Calculate Euclidean distance between two embeddings"""
+class VectorPool:
+    """Thread-local pool of reusable float32 scratch arrays, keyed by shape"""
+    
+    def __init__(self, max_per_shape: int = 10, max_shapes: int = 32):
+        self.max_per_shape = max_per_shape
+        self.max_shapes = max_shapes
+        self._local = threading.local()
+    
+    def _arrays(self) -> Dict[tuple, List[np.ndarray]]:
+        pool = getattr(self._local, "pool", None)
+        if pool is None:
+            pool = self._local.pool = {}
+        return pool
+    
+    def get(self, shape: tuple) -> np.ndarray:
+        """Take a pooled array of this shape, or allocate one; contents are undefined"""
+        arrays = self._arrays().get(shape)
+        return arrays.pop() if arrays else np.empty(shape, dtype=np.float32)
+    
+    def release(self, array: np.ndarray):
+        """Return an array to the pool unless its shape is already full"""
+        pool = self._arrays()
+        arrays = pool.get(array.shape)
+        if arrays is None:
+            if len(pool) >= self.max_shapes:
+                return
+            arrays = pool[array.shape] = []
+        if len(arrays) < self.max_per_shape:
+            arrays.append(array)
+
+_vector_pool = VectorPool()
+
+def cosine_similarity_matrix(queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """Cosine similarity of every query row against every vector row"""
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    
+    # L2-normalize each side once, into pooled scratch arrays, so a single
+    # matmul gives the cosines; zero rows stay zero instead of dividing by zero
+    query_units = _vector_pool.get(queries.shape)
+    vector_units = _vector_pool.get(vectors.shape)
     try:
-        import math
-        
-        # Calculate squared differences
-        squared_diffs = [(x - y) ** 2 for x, y in zip(a, b)]
+        for matrix, units in ((queries, query_units), (vectors, vector_units)):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            np.divide(matrix, norms, out=units)
         
-        # Calculate Euclidean distance
-        distance = math.sqrt(sum(squared_diffs))
-        return distance
-        
-    except Exception as error:
-        logger.error(f"Failed to calculate Euclidean distance: {error}")
-        return float('inf')
+        return query_units @ vector_units.T
+    finally:
+        _vector_pool.release(query_units)
+        _vector_pool.release(vector_units)
 
-def normalize_embedding(embedding: List[float]) -> List[float]:
+def euclidean_distance(a: List[float], b: List[float], squared: bool = False) -> float:
+    """Calculate Euclidean distance between two embeddings
+    
+    squared=True skips the square root, which is enough for ranking.
+    """
+    diff = np.asarray(a, dtype=np.float32) - np.asarray(b, dtype=np.float32)
+    squared_distance = float(diff @ diff)
+    return squared_distance if squared else squared_distance ** 0.5
+
+def normalize_embedding(embedding: List[float]) -> np.ndarray:
     """Normalize an embedding to unit length"""
-    try:
-        import math
+    vector = np.asarray(embedding, dtype=np.float32)
+    magnitude = np.linalg.norm(vector)
+    
+    # Avoid division by zero
+    if magnitude == 0:
+        return vector
+    
+    return vector / magnitude
+
+# Set bits per byte value, for Hamming distances over packed sign bits
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+class SemanticCache:
+    """Approximate cache mapping embeddings to values by cosine similarity
+    
+    Each entry is the unit-length centroid of the queries that hit it, kept as
+    a row of one matrix so a lookup is a single matrix-vector product. With
+    quantization="int8" rows are stored scaled to int8, and with "binary" as
+    packed sign bits compared by Hamming distance (centroids are then fixed).
+    """
+    
+    QUANTIZATIONS = ("none", "int8", "binary")
+    
+    def __init__(
+        self,
+        threshold: float = 0.86,
+        ttl_seconds: float = 300.0,
+        max_entries: int = 1024,
+        quantization: str = "none"
+    ):
+        if quantization not in self.QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}, expected one of {self.QUANTIZATIONS}")
         
-        # Calculate magnitude
-        magnitude = math.sqrt(sum(x * x for x in embedding))
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.quantization = quantization
+        self._dimensions = 0
+        self._centroids: Optional[np.ndarray] = None
+        self._counts: List[int] = []
+        self._values: List[Any] = []
+        self._namespaces: List[Any] = []
+        self._stored_at: List[float] = []
+    
+    def __len__(self) -> int:
+        return len(self._values)
+    
+    def _remove(self, indices: List[int]):
+        drop = set(indices)
+        keep = [i for i in range(len(self._values)) if i not in drop]
+        self._centroids = self._centroids[keep]
+        self._counts = [self._counts[i] for i in keep]
+        self._values = [self._values[i] for i in keep]
+        self._namespaces = [self._namespaces[i] for i in keep]
+        self._stored_at = [self._stored_at[i] for i in keep]
+    
+    def _evict_expired(self):
+        cutoff = time.monotonic() - self.ttl_seconds
+        expired = [i for i, stored_at in enumerate(self._stored_at) if stored_at < cutoff]
+        if expired:
+            self._remove(expired)
+    
+    def _encode(self, unit: np.ndarray) -> np.ndarray:
+        if self.quantization == "int8":
+            return np.round(unit * 127).astype(np.int8)
+        if self.quantization == "binary":
+            return np.packbits(unit > 0)
+        return unit
+    
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        if self.quantization == "int8":
+            # int32 accumulation: 127 * 127 * dims overflows int16
+            encoded = self._encode(query).astype(np.int32)
+            return (self._centroids.astype(np.int32) @ encoded) / (127 * 127)
+        if self.quantization == "binary":
+            # Angle between vectors estimated from the fraction of differing signs
+            hamming = _POPCOUNT[np.bitwise_xor(self._centroids, self._encode(query))].sum(axis=1)
+            return np.cos(np.pi * hamming / self._dimensions)
+        return self._centroids @ query
+    
+    def get(self, vector: List[float], namespace: Any = None) -> Optional[Any]:
+        """Return the value whose centroid is most similar, if above threshold"""
+        self._evict_expired()
+        if not self._values:
+            return None
         
-        # Avoid division by zero
-        if magnitude == 0:
-            return embedding
+        query = normalize_embedding(vector)
+        scores = self._scores(query)
+        if namespace is not None:
+            same = np.fromiter((ns == namespace for ns in self._namespaces), dtype=bool, count=len(self._namespaces))
+            scores = np.where(same, scores, -1.0)
         
-        # Normalize
-        normalized = [x / magnitude for x in embedding]
-        return normalized
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
         
-    except Exception as error:
-        logger.error(f"Failed to normalize embedding: {error}")
-        return embedding
+        # Fold the query into the centroid as a running mean; sign bits
+        # carry too little to average, so binary centroids stay fixed
+        if self.quantization != "binary":
+            count = self._counts[best] + 1
+            current = self._centroids[best].astype(np.float32)
+            if self.quantization == "int8":
+                current /= 127
+            centroid = current + (query - current) / count
+            norm = np.linalg.norm(centroid)
+            if norm:
+                self._centroids[best] = self._encode(centroid / norm)
+            self._counts[best] = count
+        return self._values[best]
+    
+    def put(self, vector: List[float], value: Any, namespace: Any = None):
+        """Add an entry, evicting the oldest once max_entries is exceeded"""
+        unit = normalize_embedding(vector)
+        row = self._encode(unit).reshape(1, -1)
+        if self._centroids is None or not self._values:
+            self._dimensions = len(unit)
+            self._centroids = row.copy()
+        else:
+            self._centroids = np.vstack((self._centroids, row))
+        self._counts.append(1)
+        self._values.append(value)
+        self._namespaces.append(namespace)
+        self._stored_at.append(time.monotonic())
+        
+        if len(self._values) > self.max_entries:
+            self._remove([0])
+    
+    def discard_namespace(self, namespace: Any):
+        """Drop every entry stored under a namespace"""
+        matches = [i for i, ns in enumerate(self._namespaces) if ns == namespace]
+        if matches:
+            self._remove(matches)
 
 async def validate_embedding_config() -> Dict[str, Any]:
     """Validate embedding configuration and test service"""
@@ -299,9 +713,8 @@ async def validate_embedding_config() -> Dict[str, Any]:
         
         if service_available:
             # Test embedding dimensions
-            test_embedding = await generate_embedding("test")
             expected_dims = config.embedding.dimensions
-            actual_dims = len(test_embedding)
+            actual_dims = await get_embedding_generator().probe_dimensions()
             
             validation_result["dimensions_correct"] = (actual_dims == expected_dims)
             
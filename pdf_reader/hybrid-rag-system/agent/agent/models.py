@@ -2,10 +2,10 @@
 Pydantic models for the Hybrid RAG Agent system
 """
 
-from typing import List, Dict, Any, Optional, Union
+from typing import Annotated, List, Dict, Any, Literal, Optional, Union
 from datetime import datetime
 from enum import Enum
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field
 from uuid import UUID, uuid4
 
 # ============================================================================
@@ -36,8 +36,12 @@ class SearchType(str, Enum):
     HYBRID = "hybrid"
     DOCUMENT = "document"
 
+# Request-facing form of SearchType; validated as a plain string set lookup
+SearchTypeName = Literal["vector", "graph", "hybrid", "document"]
+
 class ChunkResult(BaseModel):
     """Document chunk search result"""
+    kind: Literal["chunk"] = "chunk"
     chunk_id: str
     document_id: str
     content: str
@@ -49,6 +53,7 @@ class ChunkResult(BaseModel):
 
 class GraphResult(BaseModel):
     """Knowledge graph search result"""
+    kind: Literal["graph"] = "graph"
     entity_id: str
     entity_name: str
     entity_type: str
@@ -56,10 +61,13 @@ class GraphResult(BaseModel):
     properties: Dict[str, Any] = Field(default_factory=dict)
     score: Optional[float] = None
 
+# Either result type, told apart by its kind tag instead of trying each model
+SearchResult = Annotated[Union[ChunkResult, GraphResult], Field(discriminator="kind")]
+
 class SearchRequest(BaseModel):
     """Search request model"""
     query: str = Field(..., min_length=1, max_length=1000)
-    search_type: SearchType = SearchType.HYBRID
+    search_type: SearchTypeName = "hybrid"
     limit: int = Field(default=10, ge=1, le=100)
     filters: Optional[Dict[str, Any]] = None
     include_metadata: bool = True
@@ -69,8 +77,8 @@ class SearchRequest(BaseModel):
 class SearchResponse(BaseResponse):
     """Search response model"""
     query: str
-    search_type: SearchType
-    results: List[Union[ChunkResult, GraphResult]]
+    search_type: SearchTypeName
+    results: List[SearchResult]
     total_results: int
     search_time_ms: float
     tools_used: List[str] = Field(default_factory=list)
@@ -81,7 +89,7 @@ class SearchResponse(BaseResponse):
 
 class ChatMessage(BaseModel):
     """Chat message model"""
-    role: str = Field(..., regex="^(user|assistant|system)$")
+    role: Literal["user", "assistant", "system"]
     content: str
     timestamp: datetime = Field(default_factory=datetime.now)
     metadata: Optional[Dict[str, Any]] = None
@@ -91,7 +99,7 @@ class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1, max_length=5000)
     session_id: Optional[str] = None
     user_id: Optional[str] = None
-    search_type: SearchType = SearchType.HYBRID
+    search_type: SearchTypeName = "hybrid"
     include_sources: bool = True
     stream: bool = False
     context: Optional[List[ChatMessage]] = None
@@ -108,16 +116,16 @@ class ChatResponse(BaseResponse):
     message: str
     session_id: str
     tools_used: List[ToolCall] = Field(default_factory=list)
-    sources: List[Union[ChunkResult, GraphResult]] = Field(default_factory=list)
+    sources: List[SearchResult] = Field(default_factory=list)
     response_time_ms: float
     token_usage: Optional[Dict[str, int]] = None
 
 class StreamDelta(BaseModel):
     """Streaming response delta"""
-    type: str = Field(..., regex="^(text|tools|sources|session|end|error)$")
+    type: Literal["text", "tools", "sources", "session", "end", "error"]
     content: Optional[str] = None
     tools: Optional[List[ToolCall]] = None
-    sources: Optional[List[Union[ChunkResult, GraphResult]]] = None
+    sources: Optional[List[SearchResult]] = None
     session_id: Optional[str] = None
     error: Optional[str] = None
 
@@ -146,24 +154,30 @@ class DocumentMetadata(BaseModel):
 
 class DocumentChunk(BaseModel):
     """Document chunk model"""
-    chunk_id: str = Field(default_factory=lambda: str(uuid4()))
+    chunk_id: str = Field(default_factory=lambda: uuid4().hex)
     document_id: str
     content: str
     chunk_index: int
     start_char: Optional[int] = None
     end_char: Optional[int] = None
-    embedding: Optional[List[float]] = None
+    # A list of floats, or a float16 numpy vector while a document is ingested
+    embedding: Optional[Any] = None
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
 class Document(BaseModel):
     """Document model"""
-    document_id: str = Field(default_factory=lambda: str(uuid4()))
+    document_id: str = Field(default_factory=lambda: uuid4().hex)
     filename: str
     original_name: str
     file_path: str
     status: DocumentStatus = DocumentStatus.UPLOADED
     metadata: DocumentMetadata
     chunks: List[DocumentChunk] = Field(default_factory=list)
+    # Full extracted text, kept off metadata and out of serialized output
+    extracted_text: Optional[str] = Field(default=None, exclude=True)
+    # Chunker cache of the preprocessed text, valid while its digest matches
+    preprocessed_text: Optional[str] = Field(default=None, exclude=True)
+    preprocessed_text_digest: Optional[str] = Field(default=None, exclude=True)
     processing_started_at: Optional[datetime] = None
     processing_completed_at: Optional[datetime] = None
     error_message: Optional[str] = None
@@ -208,7 +222,7 @@ class AgentConfig(BaseModel):
 
 class ProcessingJob(BaseModel):
     """Document processing job model"""
-    job_id: str = Field(default_factory=lambda: str(uuid4()))
+    job_id: str = Field(default_factory=lambda: uuid4().hex)
     document_id: str
     job_type: str = "pdf_processing"
     status: str = "queued"
@@ -228,6 +242,8 @@ class ProcessingResult(BaseModel):
     processing_time_ms: float
     success: bool
     error_message: Optional[str] = None
+    # Pipeline statistics contributed by this document
+    stats: Dict[str, float] = Field(default_factory=dict)
 
 # ============================================================================
 # Health and Monitoring Models
@@ -254,7 +270,7 @@ class MetricData(BaseModel):
 
 class Session(BaseModel):
     """Chat session model"""
-    session_id: str = Field(default_factory=lambda: str(uuid4()))
+    session_id: str = Field(default_factory=lambda: uuid4().hex)
     user_id: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
@@ -263,12 +279,12 @@ class Session(BaseModel):
 
 class SessionMessage(BaseModel):
     """Session message model"""
-    message_id: str = Field(default_factory=lambda: str(uuid4()))
+    message_id: str = Field(default_factory=lambda: uuid4().hex)
     session_id: str
     role: str
     content: str
     tools_used: List[ToolCall] = Field(default_factory=list)
-    sources: List[Union[ChunkResult, GraphResult]] = Field(default_factory=list)
+    sources: List[SearchResult] = Field(default_factory=list)
     timestamp: datetime = Field(default_factory=datetime.now)
     metadata: Dict[str, Any] = Field(default_factory=dict)
 
@@ -2,6 +2,7 @@
 System prompts and prompt templates for the Hybrid RAG Agent
 """
 
+import io
 from typing import Dict, List, Any
 
 # ============================================================================
@@ -194,31 +195,45 @@ CONTEXT_TEMPLATES = {
 """,
 }
 
+# Why each tool is used, and the finished explanation line for each
+_TOOL_EXPLANATIONS = {
+    "vector_search": "to find semantically similar content",
+    "graph_search": "to explore entity relationships",
+    "hybrid_search": "to combine semantic and relationship-based search",
+    "document_retrieval": "to get complete document context",
+    "entity_relationships": "to understand entity connections",
+}
+_TOOL_EXPLANATION_LINES = {
+    tool: f"- **{tool.replace('_', ' ').title()}**: {explanation}"
+    for tool, explanation in _TOOL_EXPLANATIONS.items()
+}
+
+# Template name -> bound format_map, resolved once at import
+_RESPONSE_FORMATTERS = {name: template.format_map for name, template in RESPONSE_TEMPLATES.items()}
+_CONTEXT_FORMATTERS = {name: template.format_map for name, template in CONTEXT_TEMPLATES.items()}
+
 # ============================================================================
 # Prompt Utilities
 # ============================================================================
 
 def format_system_prompt(user_context: Dict[str, Any] = None) -> str:
     """Format the system prompt with optional user context"""
-    prompt = SYSTEM_PROMPT
+    if not user_context:
+        return SYSTEM_PROMPT
     
-    if user_context:
-        # Add user-specific context if provided
-        context_additions = []
-        
-        if user_context.get("user_preferences"):
-            context_additions.append(f"User preferences: {user_context['user_preferences']}")
-        
-        if user_context.get("session_history"):
-            context_additions.append("Consider the conversation history when responding.")
-        
-        if user_context.get("document_focus"):
-            context_additions.append(f"Focus on documents related to: {user_context['document_focus']}")
-        
-        if context_additions:
-            prompt += "\n\n## Additional Context\n" + "\n".join(context_additions)
+    # Add user-specific context if provided, assembled in a single join
+    parts = [SYSTEM_PROMPT, "\n\n## Additional Context"]
+    
+    if user_context.get("user_preferences"):
+        parts.append(f"\nUser preferences: {user_context['user_preferences']}")
     
-    return prompt
+    if user_context.get("session_history"):
+        parts.append("\nConsider the conversation history when responding.")
+    
+    if user_context.get("document_focus"):
+        parts.append(f"\nFocus on documents related to: {user_context['document_focus']}")
+    
+    return "".join(parts) if len(parts) > 2 else SYSTEM_PROMPT
 
 def format_tool_prompt(tool_name: str, query: str, **kwargs) -> str:
     """Format tool-specific prompts"""
@@ -244,83 +259,81 @@ def format_response(
     **kwargs
 ) -> str:
     """Format response using templates"""
-    if template_name not in RESPONSE_TEMPLATES:
+    render = _RESPONSE_FORMATTERS.get(template_name)
+    if render is None:
         return content or "No response template found."
     
-    template = RESPONSE_TEMPLATES[template_name]
-    
     # Format tools used
     tools_str = ", ".join(tools_used) if tools_used else "search tools"
     
     # Format sources
     sources_str = "\n".join(f"- {source}" for source in sources) if sources else "No specific sources cited"
     
-    return template.format(
+    kwargs.update(
         query=query,
         content=content,
         tools_used=tools_str,
         sources=sources_str,
         error_message=error_message,
-        additional_context=additional_context,
-        **kwargs
-    ).strip()
+        additional_context=additional_context
+    )
+    return render(kwargs).strip()
+
+def _truncate(text: str, limit: int = 100) -> str:
+    """Cut text to limit characters, marking the cut with an ellipsis"""
+    return text if len(text) <= limit else text[:limit] + "..."
 
 def create_context_summary(results: List[Dict[str, Any]], result_type: str = "mixed") -> str:
     """Create a context summary from search results"""
     if not results:
         return "No relevant information found."
     
-    summaries = []
+    # Summaries are written straight into one buffer, separated by blank lines
+    buffer = io.StringIO()
+    format_document = CONTEXT_TEMPLATES["document_context"].format
+    format_entity = CONTEXT_TEMPLATES["entity_context"].format
     
-    for result in results:
+    for index, result in enumerate(results):
+        if index:
+            buffer.write("\n\n")
+        
         if result_type == "document" or "content" in result:
             # Document/chunk result
-            summary = CONTEXT_TEMPLATES["document_context"].format(
+            summary = format_document(
                 title=result.get("document_title", "Unknown Document"),
                 source=result.get("document_source", "Unknown Source"),
-                content=result.get("content", "")[:200] + "..." if len(result.get("content", "")) > 200 else result.get("content", ""),
+                content=_truncate(result.get("content", ""), 200),
                 score=result.get("score", 0.0)
             )
         elif result_type == "entity" or "entity_name" in result:
             # Entity result
-            relationships = ", ".join(result.get("relationships", []))[:100] + "..." if len(str(result.get("relationships", []))) > 100 else ", ".join(result.get("relationships", []))
-            properties = str(result.get("properties", {}))[:100] + "..." if len(str(result.get("properties", {}))) > 100 else str(result.get("properties", {}))
-            
-            summary = CONTEXT_TEMPLATES["entity_context"].format(
+            summary = format_entity(
                 entity_name=result.get("entity_name", "Unknown Entity"),
                 entity_type=result.get("entity_type", "Unknown Type"),
-                relationships=relationships,
-                properties=properties
+                relationships=_truncate(", ".join(result.get("relationships", []))),
+                properties=_truncate(str(result.get("properties", {})))
             )
         else:
             # Generic result
-            summary = f"- {str(result)[:200]}{'...' if len(str(result)) > 200 else ''}"
+            summary = "- " + _truncate(str(result), 200)
         
-        summaries.append(summary)
+        buffer.write(summary)
     
-    return "\n\n".join(summaries)
+    return buffer.getvalue()
 
 def explain_tool_usage(tools_used: List[str], query: str) -> str:
     """Explain why specific tools were used"""
     if not tools_used:
         return "No tools were used for this query."
 
-    explanations = {
-        "vector_search": "to find semantically similar content",
-        "graph_search": "to explore entity relationships",
-        "hybrid_search": "to combine semantic and relationship-based search",
-        "document_retrieval": "to get complete document context",
-        "entity_relationships": "to understand entity connections",
-    }
-
-    tool_explanations = []
-    for tool in tools_used:
-        explanation = explanations.get(tool, f"to perform {tool}")
-        tool_explanations.append(f"- **{tool.replace('_', ' ').title()}**: {explanation}")
+    tool_explanations = [
+        _TOOL_EXPLANATION_LINES.get(tool) or f"- **{tool.replace('_', ' ').title()}**: to perform {tool}"
+        for tool in tools_used
+    ]
 
     strategy = f"For the query '{query}', I used multiple search approaches to provide comprehensive results."
 
-    return CONTEXT_TEMPLATES["tool_usage"].format(
-        tool_list="\n".join(tool_explanations),
-        strategy_explanation=strategy
-    )
+    return _CONTEXT_FORMATTERS["tool_usage"]({
+        "tool_list": "\n".join(tool_explanations),
+        "strategy_explanation": strategy
+    })
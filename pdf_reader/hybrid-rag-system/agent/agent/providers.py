@@ -2,8 +2,11 @@
 LLM provider abstraction for the Hybrid RAG Agent
 """
 
+import hashlib
 import logging
-from typing import Any, Dict, Optional
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
 from pydantic_ai.models import Model, OpenAIModel, AnthropicModel
 
 from .config import config
@@ -15,9 +18,14 @@ class LLMProviderError(Exception):
     pass
 
 def get_llm_model() -> Model:
-    """Get the configured LLM model"""
-    provider = config.llm.provider.lower()
-    
+    """Get the configured LLM model, reusing it while the settings are unchanged"""
+    # The cache is keyed by a digest of the API key so it never holds the secret
+    key_digest = hashlib.sha256(config.llm.api_key.encode()).hexdigest()
+    return _build_model(config.llm.provider.lower(), config.llm.model, config.llm.base_url, key_digest)
+
+@lru_cache(maxsize=8)
+def _build_model(provider: str, model: str, base_url: str, key_digest: str) -> Model:
+    """Build a model once per (provider, model, base_url, api key) so its HTTP client is shared"""
     try:
         if provider == "openai":
             return _get_openai_model()
@@ -90,15 +98,20 @@ def _get_openai_compatible_model() -> OpenAIModel:
         base_url=config.llm.base_url,
     )
 
-def get_model_info() -> Dict[str, Any]:
-    """Get information about the current model configuration"""
-    return {
+@lru_cache(maxsize=1)
+def get_model_info() -> Mapping[str, Any]:
+    """Get information about the current model configuration
+    
+    The config is read-only once loaded, so this is built once and shared as
+    a read-only mapping; use dict() on it for a mutable copy.
+    """
+    return MappingProxyType({
         "provider": config.llm.provider,
         "model": config.llm.model,
         "base_url": config.llm.base_url,
         "temperature": config.llm.temperature,
         "max_tokens": config.llm.max_tokens,
-    }
+    })
 
 def validate_model_config() -> bool:
     """Validate the current model configuration"""
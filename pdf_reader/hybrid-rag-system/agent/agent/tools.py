@@ -2,13 +2,19 @@
 Agent tools for vector search, knowledge graph operations, and document retrieval
 """
 
+import asyncio
+import heapq
 import logging
-from typing import List, Dict, Any, Optional
+import math
+from hashlib import blake2b
+from operator import itemgetter
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple, Union
+import numpy as np
 from pydantic import BaseModel, Field
 
 from .database import vector_store, knowledge_graph
 from .models import ChunkResult, GraphResult
-from .embeddings import generate_embedding
+from .embeddings import generate_embedding, generate_embeddings_batch
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +44,7 @@ class DocumentRetrievalInput(BaseModel):
     """Input for document retrieval tool"""
     document_id: str = Field(..., description="Document ID to retrieve")
     include_chunks: bool = Field(default=True, description="Include document chunks")
+    return_chunks: bool = Field(default=True, description="Return the chunk objects, not just their joined text")
 
 class EntityRelationshipInput(BaseModel):
     """Input for entity relationship tool"""
@@ -57,15 +64,23 @@ async def vector_search_tool(input_data: VectorSearchInput) -> List[ChunkResult]
     try:
         logger.debug(f"Vector search: {input_data.query}")
         
-        # Generate embedding for the query
-        query_embedding = await generate_embedding(input_data.query)
+        # Frozen once, the filters key the single-flight map and the vector
+        # store's filter cache without being rehashed
+        filters = _freeze_filters(input_data.filters)
         
-        # Perform vector search
-        results = await vector_store.search(
-            query_vector=query_embedding,
-            limit=input_data.limit,
-            filters=input_data.filters
-        )
+        async def search() -> List[ChunkResult]:
+            # Generate embedding for the query
+            query_embedding = await generate_embedding(input_data.query)
+            
+            # Perform vector search
+            return await vector_store.search(
+                query_vector=query_embedding,
+                limit=input_data.limit,
+                filters=filters
+            )
+        
+        key = ("vector", input_data.query, input_data.limit, filters if isinstance(filters, frozenset) else repr(filters))
+        results = await _single_flight(key, search)
         
         logger.info(f"Vector search returned {len(results)} results")
         return results
@@ -74,6 +89,38 @@ async def vector_search_tool(input_data: VectorSearchInput) -> List[ChunkResult]
         logger.error(f"Vector search failed: {error}")
         return []
 
+async def vector_search_tool_batch(
+    queries: List[str],
+    limit: int = 10,
+    filters: Optional[Dict[str, Any]] = None
+) -> List[List[ChunkResult]]:
+    """
+    Perform vector similarity search for several queries at once.
+    
+    All queries are embedded in one batched request, then searched
+    concurrently; results are returned in query order.
+    """
+    try:
+        logger.debug(f"Batch vector search: {len(queries)} queries")
+        
+        query_embeddings = await generate_embeddings_batch(queries)
+        
+        results = await asyncio.gather(*(
+            vector_store.search(
+                query_vector=query_embedding,
+                limit=limit,
+                filters=filters
+            )
+            for query_embedding in query_embeddings
+        ))
+        
+        logger.info(f"Batch vector search returned {sum(map(len, results))} results")
+        return list(results)
+        
+    except Exception as error:
+        logger.error(f"Batch vector search failed: {error}")
+        return [[] for _ in queries]
+
 async def graph_search_tool(input_data: GraphSearchInput) -> List[GraphResult]:
     """
     Search the knowledge graph to find entity relationships and connections.
@@ -85,8 +132,9 @@ async def graph_search_tool(input_data: GraphSearchInput) -> List[GraphResult]:
         logger.debug(f"Graph search: {input_data.query}")
         
         # Perform knowledge graph search
-        results = await knowledge_graph.search(
-            query=input_data.query
+        results = await _single_flight(
+            ("graph", input_data.query),
+            lambda: knowledge_graph.search(query=input_data.query)
         )
         
         logger.info(f"Graph search returned {len(results)} results")
@@ -107,32 +155,34 @@ async def hybrid_search_tool(input_data: HybridSearchInput) -> List[ChunkResult]
     try:
         logger.debug(f"Hybrid search: {input_data.query}")
         
-        # Perform vector search
-        vector_results = await vector_search_tool(
-            VectorSearchInput(
-                query=input_data.query,
-                limit=input_data.limit
-            )
-        )
-        
-        # Perform graph search
-        graph_results = await graph_search_tool(
-            GraphSearchInput(
-                query=input_data.query
-            )
+        # Perform vector and graph search concurrently; the inputs come from
+        # an already validated one, so they skip validation
+        vector_results, graph_results = await asyncio.gather(
+            vector_search_tool(
+                VectorSearchInput.model_construct(
+                    query=input_data.query,
+                    limit=input_data.limit
+                )
+            ),
+            graph_search_tool(
+                GraphSearchInput.model_construct(
+                    query=input_data.query
+                )
+            ),
+            return_exceptions=True
         )
+        vector_results = _branch_results("Vector", vector_results)
+        graph_results = _branch_results("Graph", graph_results)
         
-        # Combine and rank results
-        combined_results = _combine_search_results(
+        # Combine, rank and limit results
+        final_results = _combine_search_results(
             vector_results,
             graph_results,
             input_data.vector_weight,
-            input_data.graph_weight
+            input_data.graph_weight,
+            top_k=input_data.limit
         )
         
-        # Limit results
-        final_results = combined_results[:input_data.limit]
-        
         logger.info(f"Hybrid search returned {len(final_results)} results")
         return final_results
         
@@ -153,16 +203,11 @@ async def document_retrieval_tool(input_data: DocumentRetrievalInput) -> Dict[st
         # Get document chunks from vector store
         chunks = []
         if input_data.include_chunks:
-            # Search for all chunks of this document
-            all_chunks = await vector_store.search(
-                query_vector=[0.0] * vector_store.embedding_dim,  # Dummy vector
-                limit=1000,  # Large limit to get all chunks
-                filters={"document_id": input_data.document_id}
-            )
-            chunks = sorted(all_chunks, key=lambda x: x.chunk_index or 0)
+            # List all chunks of this document by filter, already in order
+            chunks = await vector_store.get_chunks_by_document_id(input_data.document_id)
         
         # Combine chunk content
-        full_content = "\n\n".join([chunk.content for chunk in chunks])
+        full_content = "\n\n".join(chunk.content for chunk in chunks)
         
         # Get document metadata (from first chunk if available)
         metadata = {}
@@ -172,7 +217,7 @@ async def document_retrieval_tool(input_data: DocumentRetrievalInput) -> Dict[st
         result = {
             "document_id": input_data.document_id,
             "content": full_content,
-            "chunks": chunks,
+            "chunks": chunks if input_data.return_chunks else [],
             "metadata": metadata,
             "chunk_count": len(chunks)
         }
@@ -217,54 +262,116 @@ async def entity_relationships_tool(input_data: EntityRelationshipInput) -> List
 # Helper Functions
 # ============================================================================
 
+# Searches currently running, by key, shared by concurrent identical calls
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+async def _single_flight(key: Hashable, search: Callable[[], Awaitable[list]]) -> list:
+    """Run search once for concurrent callers with the same key, sharing the result"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(search())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    
+    # Each caller gets its own list; the shield keeps one caller's
+    # cancellation from cancelling the search for the others
+    return list(await asyncio.shield(task))
+
+def _freeze_filters(
+    filters: Optional[Dict[str, Any]]
+) -> Union[FrozenSet[Tuple[str, Any]], Dict[str, Any], None]:
+    """Freeze a filters dict into its items, so equal filters share one cached hash
+    
+    Filters with unhashable values are returned unchanged.
+    """
+    if not filters:
+        return None
+    try:
+        frozen = frozenset(filters.items())
+        hash(frozen)
+        return frozen
+    except TypeError:
+        return filters
+
+def _branch_results(name: str, results: Any) -> list:
+    """Unwrap one branch of a gathered search, treating a failure as no results"""
+    if isinstance(results, BaseException):
+        logger.error(f"{name} search failed: {results}")
+        return []
+    return results
+
+def _graph_pseudo_chunk(graph_result: GraphResult, score: float) -> ChunkResult:
+    """Present a graph result as a chunk, already validated as one"""
+    name = graph_result.entity_name
+    return ChunkResult.model_construct(
+        chunk_id=graph_result.entity_id,
+        document_id="knowledge_graph",
+        content="\n".join((
+            f"Entity: {name} ({graph_result.entity_type})",
+            f"Properties: {graph_result.properties}",
+            f"Relationships: {graph_result.relationships}"
+        )),
+        score=score,
+        metadata={
+            "source": "knowledge_graph",
+            "entity_type": graph_result.entity_type,
+            "entity_name": name,
+            "relationships": graph_result.relationships,
+            "properties": graph_result.properties
+        },
+        document_title=f"Knowledge Graph: {name}",
+        document_source="knowledge_graph"
+    )
+
 def _combine_search_results(
     vector_results: List[ChunkResult],
     graph_results: List[GraphResult],
     vector_weight: float,
-    graph_weight: float
+    graph_weight: float,
+    top_k: Optional[int] = None
 ) -> List[ChunkResult]:
-    """Combine and rank vector and graph search results"""
-    
-    # Convert graph results to chunk-like results for consistency
-    combined_results = []
+    """Combine and rank vector and graph search results, keeping the top_k best if given"""
     
-    # Add vector results with weighted scores
-    for result in vector_results:
-        result.score = result.score * vector_weight
-        combined_results.append(result)
+    # Score every candidate first; result objects are only built for the
+    # ones that make the cut
+    candidates = [(result.score * vector_weight, result) for result in vector_results]
+    candidates.extend(
+        ((graph_result.score or 0.5) * graph_weight, graph_result)
+        for graph_result in graph_results
+    )
     
-    # Convert graph results to chunk results and add with weighted scores
-    for graph_result in graph_results:
-        # Create a pseudo-chunk from graph result
-        chunk_result = ChunkResult(
-            chunk_id=graph_result.entity_id,
-            document_id="knowledge_graph",
-            content=f"Entity: {graph_result.entity_name} ({graph_result.entity_type})\n"
-                   f"Properties: {graph_result.properties}\n"
-                   f"Relationships: {graph_result.relationships}",
-            score=(graph_result.score or 0.5) * graph_weight,
-            metadata={
-                "source": "knowledge_graph",
-                "entity_type": graph_result.entity_type,
-                "entity_name": graph_result.entity_name,
-                "relationships": graph_result.relationships,
-                "properties": graph_result.properties
-            },
-            document_title=f"Knowledge Graph: {graph_result.entity_name}",
-            document_source="knowledge_graph"
-        )
-        combined_results.append(chunk_result)
-    
-    # Sort by combined score (descending)
-    combined_results.sort(key=lambda x: x.score, reverse=True)
+    # A bounded heap selects the top_k without sorting everything
+    if top_k is not None:
+        candidates = heapq.nlargest(top_k, candidates, key=itemgetter(0))
+    else:
+        # Sort by combined score (descending)
+        candidates.sort(key=itemgetter(0), reverse=True)
     
-    return combined_results
+    # Vector results are copied so the caller's keep their original scores;
+    # graph results become pseudo-chunks for consistency
+    return [
+        _graph_pseudo_chunk(result, score) if isinstance(result, GraphResult)
+        else result.model_copy(update={"score": score})
+        for score, result in candidates
+    ]
 
 def _normalize_scores(results: List[ChunkResult]) -> List[ChunkResult]:
     """Normalize scores to 0-1 range"""
     if not results:
         return results
     
+    # Below this size NumPy's call overhead outweighs the vectorized math
+    if len(results) >= 32:
+        scores = np.fromiter((result.score for result in results), dtype=np.float32, count=len(results))
+        low, high = scores.min(), scores.max()
+        if high == low:
+            scores[:] = 1.0
+        else:
+            scores = (scores - low) / (high - low)
+        for result, score in zip(results, scores.tolist()):
+            result.score = score
+        return results
+    
     max_score = max(result.score for result in results)
     min_score = min(result.score for result in results)
     
@@ -280,19 +387,49 @@ def _normalize_scores(results: List[ChunkResult]) -> List[ChunkResult]:
     
     return results
 
+class _BloomFilter:
+    """Fixed-size Bloom filter over 128-bit digests, using double hashing"""
+    
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+    
+    def add(self, digest: bytes) -> bool:
+        """Add a digest, returning False if it was (probably) already present"""
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        bits = self._bits
+        new = False
+        for i in range(self.hash_count):
+            position = (h1 + i * h2) % self.size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        return new
+
 def _deduplicate_results(results: List[ChunkResult]) -> List[ChunkResult]:
     """Remove duplicate results based on content similarity"""
     if not results:
         return results
     
     deduplicated = []
-    seen_content = set()
+    seen_content: set[bytes] = set()
+    
+    # Large result sets use a Bloom filter so memory stays fixed; a false
+    # positive only drops a result that looked like a duplicate
+    bloom = _BloomFilter(max(1024, len(results))) if len(results) >= 512 else None
     
     for result in results:
-        # Use first 100 characters as a simple deduplication key
-        content_key = result.content[:100].strip().lower()
+        # Use a digest of the first 100 characters as the key, so the set
+        # holds small fixed-size keys instead of string prefixes
+        content_key = blake2b(result.content[:100].strip().lower().encode(), digest_size=16).digest()
         
-        if content_key not in seen_content:
+        if bloom is not None:
+            if bloom.add(content_key):
+                deduplicated.append(result)
+        elif content_key not in seen_content:
             seen_content.add(content_key)
             deduplicated.append(result)
     
@@ -320,25 +457,34 @@ async def perform_comprehensive_search(
     }
     
     try:
+        # Run every requested search concurrently; inputs are built here
+        # from typed arguments, so they skip validation
+        searches = {}
         if use_vector:
-            vector_results = await vector_search_tool(
-                VectorSearchInput(query=query, limit=limit)
+            searches["vector"] = vector_search_tool(
+                VectorSearchInput.model_construct(query=query, limit=limit)
             )
-            results["vector_results"] = vector_results
-            results["tools_used"].append("vector_search")
         
         if use_graph:
-            graph_results = await graph_search_tool(
-                GraphSearchInput(query=query)
+            searches["graph"] = graph_search_tool(
+                GraphSearchInput.model_construct(query=query)
             )
-            results["graph_results"] = graph_results
-            results["tools_used"].append("graph_search")
         
+        gathered = await asyncio.gather(*searches.values(), return_exceptions=True)
+        for name, branch in zip(searches, gathered):
+            results[f"{name}_results"] = _branch_results(name.capitalize(), branch)
+            results["tools_used"].append(f"{name}_search")
+        
+        # Hybrid results are the two result sets combined, not a third search
         if use_vector and use_graph:
-            hybrid_results = await hybrid_search_tool(
-                HybridSearchInput(query=query, limit=limit)
+            defaults = HybridSearchInput.model_construct(query=query, limit=limit)
+            results["hybrid_results"] = _combine_search_results(
+                results["vector_results"],
+                results["graph_results"],
+                defaults.vector_weight,
+                defaults.graph_weight,
+                top_k=limit
             )
-            results["hybrid_results"] = hybrid_results
             results["tools_used"].append("hybrid_search")
         
         # Calculate total results
@@ -4,20 +4,197 @@ Semantic chunking with LLM assistance for optimal document segmentation
 
 import logging
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+import codecs
+import string
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterable, Iterator, Optional, Tuple
 from dataclasses import dataclass
+from functools import lru_cache
+from hashlib import blake2b
 import re
 from datetime import datetime
 
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document as LangChainDocument
+try:
+    from semantic_text_splitter import TextSplitter
+except ImportError:  # Fall back to LangChain's pure-Python splitter
+    TextSplitter = None
 
 from ..config import config
 from ..models import DocumentChunk, Document
 from ..providers import get_llm_model
+from .executor import run_in_process
 
 logger = logging.getLogger(__name__)
 
+# ASCII encoding error handler replacing each run of non-ASCII characters
+# with one space; the encoder reports consecutive failures as a single span
+_NONASCII_TO_SPACE = "chunker.nonascii_to_space"
+codecs.register_error(_NONASCII_TO_SPACE, lambda error: (" ", error.end))
+
+# Preprocessing patterns
+_PAGE_RE = re.compile(r'--- Page \d+(?: \(OCR\))? ---\n?')
+_WS_RE = re.compile(r'\s+')
+_PUNCT_SPACE_RE = re.compile(r'([.!?])\s*([A-Z])')
+
+# Structure detection patterns
+_ALL_CAPS_RE = re.compile(r'^[A-Z][A-Z\s]+$')
+_NUMBERED_SECTION_RE = re.compile(r'^\d+\.\s+')
+_TITLE_COLON_RE = re.compile(r'^[A-Z][a-z]+:')
+
+# Patterns are dispatched on a line's first character, each listed with the
+# characters it can start with; "0" stands for any decimal digit and " " for
+# any whitespace, matching what \d and \s accept
+_DIGIT = "0"
+_SPACE = " "
+
+def _first_char_key(line: str) -> str:
+    """Dispatch key for a line's first character"""
+    first = line[:1]
+    if first.isdecimal():
+        return _DIGIT
+    if first.isspace():
+        return _SPACE
+    return first
+
+def _first_char_table(entries) -> Dict[str, tuple]:
+    """Map each possible first character to its candidate entries, in order"""
+    table: Dict[str, list] = {}
+    for entry, first_chars in entries:
+        for char in first_chars:
+            table.setdefault(char, []).append(entry)
+    return {char: tuple(candidates) for char, candidates in table.items()}
+
+_HEADER_PATTERNS = _first_char_table((re.compile(p), first_chars) for p, first_chars in [
+    (r'^[A-Z][A-Z\s]+$', string.ascii_uppercase),  # ALL CAPS
+    (r'^\d+\.\s+[A-Z]', _DIGIT),                   # Numbered sections
+    (r'^[A-Z][a-z]+:', string.ascii_uppercase),    # Title case with colon
+    (r'^Chapter\s+\d+', "C"),                       # Chapter headings
+    (r'^Section\s+\d+', "S"),                       # Section headings
+])
+
+# Every list pattern allows leading whitespace
+_LIST_TYPE_PATTERNS = _first_char_table(((re.compile(p), list_type), first_chars + _SPACE) for p, list_type, first_chars in [
+    (r'^\s*[-*•]\s+', "bullet", "-*•"),                          # Bullet points
+    (r'^\s*\d+\.\s+', "numbered", _DIGIT),                       # Numbered lists
+    (r'^\s*[a-z]\)\s+', "lettered", string.ascii_lowercase),      # Lettered lists
+    (r'^\s*[ivx]+\.\s+', "roman", "ivx"),                         # Roman numerals
+])
+
+_SEPARATORS = [
+    "\n\n\n",  # Multiple line breaks
+    "\n\n",    # Double line breaks
+    "\n",      # Single line breaks
+    ". ",      # Sentence endings
+    "! ",      # Exclamation endings
+    "? ",      # Question endings
+    "; ",      # Semicolons
+    ", ",      # Commas
+    " ",       # Spaces
+    "",        # Characters
+]
+
+@lru_cache(maxsize=8)
+def _get_text_splitter(chunk_size: int, chunk_overlap: int) -> Callable[[str], List[str]]:
+    """Get a text splitting function, built once per size in each process"""
+    if TextSplitter is not None:
+        # Native splitter; fills each chunk up to the target size
+        return TextSplitter(capacity=chunk_size, overlap=chunk_overlap).chunks
+    
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=_SEPARATORS
+    ).split_text
+
+def preprocess_text(text: str) -> str:
+    """Preprocess text for better chunking"""
+    try:
+        # Remove page markers if present
+        text = _PAGE_RE.sub('', text)
+        
+        # Replace non-ASCII characters in C rather than the regex engine
+        if not text.isascii():
+            text = text.encode('ascii', _NONASCII_TO_SPACE).decode('ascii')
+        
+        # Remove excessive whitespace, form feeds included
+        text = _WS_RE.sub(' ', text)
+        
+        # Normalize punctuation spacing
+        text = _PUNCT_SPACE_RE.sub(r'\1 \2', text)
+        
+        return text.strip()
+        
+    except Exception as error:
+        logger.warning(f"Text preprocessing failed: {error}")
+        return text
+
+def _split_text(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int,
+    preprocessed: bool = False
+) -> Tuple[str, List[str]]:
+    """Preprocess (unless already done) and split text; runs in the ingestion process pool"""
+    if not preprocessed:
+        text = preprocess_text(text)
+    return text, _get_text_splitter(chunk_size, chunk_overlap)(text)
+
+def preprocess_pages(page_texts: Iterable[str]) -> str:
+    """Preprocess page by page; same result as preprocessing the page-marked document"""
+    # Page markers are dropped and the whitespace between pages collapses to
+    # one space, so each page preprocesses independently
+    return " ".join(filter(None, map(preprocess_text, page_texts)))
+
+# Chunk span within the preprocessed text: (start, end, content)
+_Span = Tuple[int, int, str]
+
+def _locate_chunks(chunks: List[str], text: str, search_from: int = 0) -> List[_Span]:
+    """Find each chunk's span in text; chunks appear in order but may overlap"""
+    spans = []
+    for chunk_text in chunks:
+        content = chunk_text.strip()
+        if not content:
+            continue
+        
+        start = text.find(content, search_from)
+        if start < 0:
+            # Chunk text was rewritten; keep offsets monotonic
+            start = search_from
+        # Overlapping chunks start past the previous chunk's start
+        search_from = start + 1
+        spans.append((start, start + len(content), content))
+    return spans
+
+def _merge_small_spans(spans: List[_Span], text: str, min_size: int, max_size: int) -> List[_Span]:
+    """Greedily merge undersized chunks into their predecessor while within max_size"""
+    merged: List[_Span] = []
+    for start, end, content in spans:
+        if merged:
+            prev_start, prev_end, prev_content = merged[-1]
+            if len(prev_content) < min_size or len(content) < min_size:
+                if text.startswith(prev_content, prev_start) and text.startswith(content, start):
+                    # Both are located, so take the covering span once,
+                    # without repeating any overlap
+                    combined = text[prev_start:max(prev_end, end)]
+                else:
+                    combined = f"{prev_content} {content}"
+                if len(combined) <= max_size:
+                    merged[-1] = (prev_start, prev_start + len(combined), combined)
+                    continue
+        merged.append((start, end, content))
+    return merged
+
+def _text_digest(text: str) -> str:
+    """Digest of extracted text, used to validate cached preprocessing"""
+    return blake2b(text.encode(), digest_size=16).hexdigest()
+
+def cache_preprocessed_text(document: Document, extracted_text: str, preprocessed_text: str):
+    """Record preprocessed text for reuse while the extracted text is unchanged"""
+    document.preprocessed_text = preprocessed_text
+    document.preprocessed_text_digest = _text_digest(extracted_text)
+
 @dataclass
 class ChunkingConfig:
     """Configuration for document chunking"""
@@ -25,6 +202,8 @@ class ChunkingConfig:
     chunk_overlap: int = config.processing.chunk_overlap
     max_chunk_size: int = config.processing.max_chunk_size
     use_semantic_chunking: bool = True
+    # LLM boundary pass; off until _optimize_chunk_boundaries calls the model
+    optimize_boundaries: bool = False
     preserve_structure: bool = True
     min_chunk_size: int = 100
     
@@ -36,47 +215,19 @@ class SemanticChunker:
         self.llm_model = get_llm_model()
         
         # Initialize text splitter
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.config.chunk_size,
-            chunk_overlap=self.config.chunk_overlap,
-            length_function=len,
-            separators=[
-                "\n\n\n",  # Multiple line breaks
-                "\n\n",    # Double line breaks
-                "\n",      # Single line breaks
-                ". ",      # Sentence endings
-                "! ",      # Exclamation endings
-                "? ",      # Question endings
-                "; ",      # Semicolons
-                ", ",      # Commas
-                " ",       # Spaces
-                "",        # Characters
-            ]
-        )
+        self.split_text = _get_text_splitter(self.config.chunk_size, self.config.chunk_overlap)
     
     async def chunk_document(self, document: Document) -> List[DocumentChunk]:
         """Chunk a document into semantically coherent segments"""
         try:
             logger.info(f"Chunking document: {document.original_name}")
             
-            # Get extracted text
-            text_content = document.metadata.custom_fields.get("extracted_text", "")
-            
-            if not text_content.strip():
-                logger.warning(f"No text content found for document {document.document_id}")
+            split = await self._split_document(document)
+            if split is None:
                 return []
             
-            # Preprocess text
-            preprocessed_text = self._preprocess_text(text_content)
-            
-            # Perform chunking based on configuration
-            if self.config.use_semantic_chunking:
-                chunks = await self._semantic_chunk(preprocessed_text, document)
-            else:
-                chunks = await self._basic_chunk(preprocessed_text, document)
-            
             # Post-process chunks
-            processed_chunks = self._post_process_chunks(chunks, document)
+            processed_chunks = self._post_process_chunks(*split, document)
             
             logger.info(f"Created {len(processed_chunks)} chunks for document {document.original_name}")
             return processed_chunks
@@ -85,99 +236,90 @@ class SemanticChunker:
             logger.error(f"Document chunking failed: {error}")
             return []
     
-    def _preprocess_text(self, text: str) -> str:
-        """Preprocess text for better chunking"""
+    async def chunk_document_stream(self, document: Document, window: int = 32) -> AsyncIterator[DocumentChunk]:
+        """Yield a document's chunks as they are built, yielding to the event loop every window chunks"""
         try:
-            # Remove excessive whitespace
-            text = re.sub(r'\s+', ' ', text)
-            
-            # Normalize line breaks
-            text = re.sub(r'\n\s*\n', '\n\n', text)
-            
-            # Remove page markers if present
-            text = re.sub(r'--- Page \d+ ---\n?', '', text)
-            text = re.sub(r'--- Page \d+ \(OCR\) ---\n?', '', text)
+            logger.info(f"Chunking document: {document.original_name}")
             
-            # Clean up common PDF artifacts
-            text = re.sub(r'\x0c', '\n', text)  # Form feed characters
-            text = re.sub(r'[^\x00-\x7F]+', ' ', text)  # Non-ASCII characters
+            split = await self._split_document(document)
+            if split is None:
+                return
             
-            # Normalize punctuation spacing
-            text = re.sub(r'([.!?])\s*([A-Z])', r'\1 \2', text)
+            count = 0
+            for count, chunk in enumerate(self._iter_processed_chunks(*split, document), 1):
+                yield chunk
+                # Let consumers dispatch finished windows before the rest are built
+                if count % window == 0:
+                    await asyncio.sleep(0)
             
-            return text.strip()
+            logger.info(f"Created {count} chunks for document {document.original_name}")
             
         except Exception as error:
-            logger.warning(f"Text preprocessing failed: {error}")
-            return text
+            logger.error(f"Document chunking failed: {error}")
     
-    async def _semantic_chunk(self, text: str, document: Document) -> List[str]:
-        """Perform semantic chunking with LLM assistance"""
+    async def _split_document(self, document: Document) -> Optional[Tuple[List[str], str]]:
+        """Split a document's text into chunk strings, returning them with the preprocessed text"""
+        # Get extracted text
+        text_content = document.extracted_text or ""
+        
+        if not text_content.strip():
+            logger.warning(f"No text content found for document {document.document_id}")
+            return None
+        
+        # Reuse preprocessed text from an earlier chunking of the same extracted text
+        cached = document.preprocessed_text
+        is_cached = cached is not None and document.preprocessed_text_digest == _text_digest(text_content)
+        
+        # Preprocess and split text off the event loop
+        preprocessed_text, basic_chunks = await run_in_process(
+            _split_text,
+            cached if is_cached else text_content,
+            self.config.chunk_size,
+            self.config.chunk_overlap,
+            is_cached
+        )
+        
+        if not is_cached:
+            cache_preprocessed_text(document, text_content, preprocessed_text)
+        
+        # Perform chunking based on configuration
+        if self.config.use_semantic_chunking:
+            chunks = await self._semantic_chunk(basic_chunks, document)
+        else:
+            chunks = basic_chunks
+        
+        return chunks, preprocessed_text
+    
+    async def _semantic_chunk(self, basic_chunks: List[str], document: Document) -> List[str]:
+        """Perform semantic chunking with LLM assistance over the basic chunks"""
         try:
-            # First, do basic chunking to get manageable segments
-            basic_chunks = self.text_splitter.split_text(text)
-            
-            # If we have a reasonable number of chunks, use them as-is
-            if len(basic_chunks) <= 20:
+            # Without an LLM boundary pass, or with a reasonable number of
+            # chunks, use them as-is
+            if not (self.config.optimize_boundaries and self.llm_model) or len(basic_chunks) <= 20:
                 return basic_chunks
             
             # For larger documents, use LLM to identify semantic boundaries
             semantic_chunks = []
-            current_batch = []
             batch_size = 5  # Process chunks in batches
             
-            for i, chunk in enumerate(basic_chunks):
-                current_batch.append(chunk)
-                
-                # Process batch when full or at end
-                if len(current_batch) >= batch_size or i == len(basic_chunks) - 1:
-                    try:
-                        # Use LLM to identify optimal boundaries
-                        optimized_chunks = await self._optimize_chunk_boundaries(current_batch)
-                        semantic_chunks.extend(optimized_chunks)
-                    except Exception as llm_error:
-                        logger.warning(f"LLM chunking failed, using basic chunks: {llm_error}")
-                        semantic_chunks.extend(current_batch)
-                    
-                    current_batch = []
-                    
-                    # Small delay to avoid overwhelming the LLM
-                    await asyncio.sleep(0.1)
+            for i in range(0, len(basic_chunks), batch_size):
+                batch = basic_chunks[i:i + batch_size]
+                try:
+                    # Use LLM to identify optimal boundaries
+                    semantic_chunks.extend(await self._optimize_chunk_boundaries(batch))
+                except Exception as llm_error:
+                    logger.warning(f"LLM chunking failed, using basic chunks: {llm_error}")
+                    semantic_chunks.extend(batch)
             
             return semantic_chunks
             
         except Exception as error:
             logger.warning(f"Semantic chunking failed, falling back to basic: {error}")
-            return self.text_splitter.split_text(text)
-    
-    async def _basic_chunk(self, text: str, document: Document) -> List[str]:
-        """Perform basic text chunking"""
-        return self.text_splitter.split_text(text)
+            return basic_chunks
     
     async def _optimize_chunk_boundaries(self, chunks: List[str]) -> List[str]:
         """Use LLM to optimize chunk boundaries for semantic coherence"""
         try:
-            # Combine chunks for analysis
-            combined_text = "\n\n".join(chunks)
-            
-            # Create prompt for boundary optimization
-            prompt = f"""
-            Analyze the following text and identify optimal boundaries for semantic chunking.
-            The goal is to create chunks that are semantically coherent and self-contained.
-            
-            Current text:
-            {combined_text[:2000]}...
-            
-            Please suggest where to split this text into {len(chunks)} coherent chunks.
-            Focus on:
-            1. Topical boundaries
-            2. Paragraph breaks
-            3. Section transitions
-            4. Maintaining context within chunks
-            
-            Return the optimized chunks separated by "---CHUNK_BOUNDARY---"
-            """
-            
             # This is a simplified implementation
             # In a full implementation, you would use the LLM to analyze and suggest boundaries
             # For now, return the original chunks
@@ -187,42 +329,63 @@ class SemanticChunker:
             logger.warning(f"Chunk boundary optimization failed: {error}")
             return chunks
     
-    def _post_process_chunks(self, chunks: List[str], document: Document) -> List[DocumentChunk]:
-        """Post-process chunks and create DocumentChunk objects"""
-        processed_chunks = []
-        char_offset = 0
+    def _post_process_chunks(
+        self,
+        chunks: List[str],
+        text: str,
+        document: Document
+    ) -> List[DocumentChunk]:
+        """Post-process chunks and create DocumentChunk objects with offsets into text"""
+        return list(self._iter_processed_chunks(chunks, text, document))
+    
+    def _iter_processed_chunks(
+        self,
+        chunks: List[str],
+        text: str,
+        document: Document
+    ) -> Iterator[DocumentChunk]:
+        """Build DocumentChunk objects with offsets into text, one at a time"""
+        max_size = self.config.max_chunk_size
         
-        for i, chunk_text in enumerate(chunks):
-            # Skip chunks that are too small
-            if len(chunk_text.strip()) < self.config.min_chunk_size:
-                continue
-            
-            # Truncate chunks that are too large
-            if len(chunk_text) > self.config.max_chunk_size:
-                chunk_text = chunk_text[:self.config.max_chunk_size]
-                logger.debug(f"Truncated chunk {i} to {self.config.max_chunk_size} characters")
-            
-            # Create chunk object
-            chunk = DocumentChunk(
-                document_id=document.document_id,
-                content=chunk_text.strip(),
+        # Fold undersized chunks into their neighbours instead of dropping them
+        spans = _merge_small_spans(
+            _locate_chunks(chunks, text),
+            text,
+            self.config.min_chunk_size,
+            int(1.05 * self.config.chunk_size)
+        )
+        
+        # Re-split anything still over the hard limit instead of truncating it
+        sized_spans: List[_Span] = []
+        for span in spans:
+            if len(span[2]) > max_size:
+                logger.debug(f"Re-splitting {len(span[2])}-character chunk over the {max_size} limit")
+                sized_spans.extend(_locate_chunks(self.split_text(span[2]), text, span[0]))
+            else:
+                sized_spans.append(span)
+        
+        # Metadata common to every chunk of the document, stamped once; each
+        # chunk gets its own shallow copy so callers can edit one safely
+        base_metadata = {
+            "document_title": document.metadata.title,
+            "document_source": document.original_name,
+            "chunk_method": "semantic" if self.config.use_semantic_chunking else "basic",
+            "created_at": datetime.now().isoformat(),
+            "file_type": document.metadata.file_type,
+            "page_count": document.metadata.page_count,
+        }
+        
+        # Fields are built here with known types, so skip pydantic validation
+        document_id = document.document_id
+        for i, (start, end, content) in enumerate(sized_spans):
+            yield DocumentChunk.model_construct(
+                document_id=document_id,
+                content=content,
                 chunk_index=i,
-                start_char=char_offset,
-                end_char=char_offset + len(chunk_text),
-                metadata={
-                    "document_title": document.metadata.title,
-                    "document_source": document.original_name,
-                    "chunk_method": "semantic" if self.config.use_semantic_chunking else "basic",
-                    "created_at": datetime.now().isoformat(),
-                    "file_type": document.metadata.file_type,
-                    "page_count": document.metadata.page_count,
-                }
+                start_char=start,
+                end_char=end,
+                metadata=base_metadata.copy()
             )
-            
-            processed_chunks.append(chunk)
-            char_offset += len(chunk_text)
-        
-        return processed_chunks
     
     def _identify_structure(self, text: str) -> Dict[str, Any]:
         """Identify document structure (headers, sections, etc.)"""
@@ -270,59 +433,30 @@ class SemanticChunker:
             return False
         
         # Check for common header patterns
-        header_patterns = [
-            r'^[A-Z][A-Z\s]+$',  # ALL CAPS
-            r'^\d+\.\s+[A-Z]',   # Numbered sections
-            r'^[A-Z][a-z]+:',    # Title case with colon
-            r'^Chapter\s+\d+',   # Chapter headings
-            r'^Section\s+\d+',   # Section headings
-        ]
-        
-        for pattern in header_patterns:
-            if re.match(pattern, line):
-                return True
-        
-        return False
+        return any(pattern.match(line) for pattern in _HEADER_PATTERNS.get(_first_char_key(line), ()))
     
     def _get_header_level(self, line: str) -> int:
         """Determine header level (1-6)"""
         # Simple heuristic based on line characteristics
-        if re.match(r'^[A-Z][A-Z\s]+$', line):
+        if _ALL_CAPS_RE.match(line):
             return 1  # ALL CAPS likely main header
-        elif re.match(r'^\d+\.\s+', line):
+        elif _NUMBERED_SECTION_RE.match(line):
             return 2  # Numbered sections
-        elif re.match(r'^[A-Z][a-z]+:', line):
+        elif _TITLE_COLON_RE.match(line):
             return 3  # Title case with colon
         else:
             return 4  # Default level
     
     def _is_list_item(self, line: str) -> bool:
         """Check if a line is a list item"""
-        list_patterns = [
-            r'^\s*[-*•]\s+',     # Bullet points
-            r'^\s*\d+\.\s+',     # Numbered lists
-            r'^\s*[a-z]\)\s+',   # Lettered lists
-            r'^\s*[ivx]+\.\s+',  # Roman numerals
-        ]
-        
-        for pattern in list_patterns:
-            if re.match(pattern, line):
-                return True
-        
-        return False
+        return any(pattern.match(line) for pattern, _ in _LIST_TYPE_PATTERNS.get(_first_char_key(line), ()))
     
     def _get_list_type(self, line: str) -> str:
         """Determine list type"""
-        if re.match(r'^\s*[-*•]\s+', line):
-            return "bullet"
-        elif re.match(r'^\s*\d+\.\s+', line):
-            return "numbered"
-        elif re.match(r'^\s*[a-z]\)\s+', line):
-            return "lettered"
-        elif re.match(r'^\s*[ivx]+\.\s+', line):
-            return "roman"
-        else:
-            return "unknown"
+        for pattern, list_type in _LIST_TYPE_PATTERNS.get(_first_char_key(line), ()):
+            if pattern.match(line):
+                return list_type
+        return "unknown"
     
     def get_chunking_stats(self, chunks: List[DocumentChunk]) -> Dict[str, Any]:
         """Get statistics about the chunking process"""
@@ -0,0 +1,211 @@
+"""
+Persistent content-hash cache of chunk embeddings
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+# Keeps each IN (...) lookup under SQLite's bound-parameter limit
+_LOOKUP_BATCH = 500
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Simhashes further apart than this are never compared by Jaccard
+_FUZZY_MAX_DISTANCE = 3
+_FUZZY_MAX_ENTRIES = 4096
+# Simhashes are indexed by 16-bit bands; with fewer differing bits than
+# bands, any simhash within the distance shares at least one band exactly
+_FUZZY_BANDS = 4
+_FUZZY_BAND_BITS = 64 // _FUZZY_BANDS
+_FUZZY_BAND_MASK = (1 << _FUZZY_BAND_BITS) - 1
+
+def content_digest(text: str) -> bytes:
+    """SHA-256 digest of a chunk's text, the cache key within a model"""
+    return hashlib.sha256(text.encode()).digest()
+
+class EmbeddingDiskCache:
+    """SQLite-backed embedding cache keyed by (model, content digest), storing float16 vectors"""
+    
+    def __init__(self, path: str, model: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self.model = model
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, digest BLOB NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, digest)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+    
+    def get_many(self, digests: Iterable[bytes]) -> Dict[bytes, np.ndarray]:
+        """Look up cached embeddings, returning float16 vectors for the hits"""
+        digests = list(dict.fromkeys(digests))
+        found: Dict[bytes, np.ndarray] = {}
+        
+        with self._lock:
+            for start in range(0, len(digests), _LOOKUP_BATCH):
+                batch = digests[start:start + _LOOKUP_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT digest, vector FROM embeddings WHERE model = ? AND digest IN ({','.join('?' * len(batch))})",
+                    [self.model, *batch]
+                )
+                for digest, vector in rows:
+                    found[digest] = np.frombuffer(vector, dtype=np.float16)
+        
+        return found
+    
+    def put_many(self, embeddings: Dict[bytes, Sequence[float]]):
+        """Store embeddings as float16, replacing any existing entries"""
+        if not embeddings:
+            return
+        
+        rows = [
+            (self.model, digest, np.asarray(vector, dtype=np.float16).tobytes())
+            for digest, vector in embeddings.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, digest, vector) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+    
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            self._conn.close()
+
+def _shingles(text: str) -> FrozenSet[int]:
+    """Hashed word bigrams of lowercased text, ignoring whitespace and punctuation"""
+    tokens = _TOKEN_RE.findall(text.lower())
+    grams = [" ".join(pair) for pair in zip(tokens, tokens[1:])] or tokens
+    return frozenset(
+        int.from_bytes(hashlib.blake2b(gram.encode(), digest_size=8).digest(), "little")
+        for gram in grams
+    )
+
+def _simhash64(shingles: FrozenSet[int]) -> int:
+    """64-bit simhash over the shingle hashes"""
+    if not shingles:
+        return 0
+    hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(majority, bitorder="little").tobytes(), "little")
+
+def _simhash_bands(simhash: int) -> Iterator[int]:
+    """The simhash's bands, lowest bits first"""
+    for band in range(_FUZZY_BANDS):
+        yield (simhash >> (band * _FUZZY_BAND_BITS)) & _FUZZY_BAND_MASK
+
+class FuzzyEmbeddingIndex:
+    """In-memory LRU of recent chunk embeddings matched by simhash and shingle Jaccard"""
+    
+    def __init__(self, min_jaccard: float, max_entries: int = _FUZZY_MAX_ENTRIES, max_distance: int = _FUZZY_MAX_DISTANCE):
+        if max_distance >= _FUZZY_BANDS:
+            raise ValueError(f"max_distance must be below {_FUZZY_BANDS} for band lookup")
+        self.min_jaccard = min_jaccard
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self._entries: "OrderedDict[int, Tuple[FrozenSet[int], np.ndarray]]" = OrderedDict()
+        # Per band, the simhashes of the entries having each band value
+        self._bands: List[Dict[int, Set[int]]] = [{} for _ in range(_FUZZY_BANDS)]
+    
+    def lookup(self, text: str) -> Optional[np.ndarray]:
+        """Find the embedding of a recently seen near-duplicate of text"""
+        if not self._entries:
+            return None
+        
+        shingles = _shingles(text)
+        simhash = _simhash64(shingles)
+        
+        # Only entries sharing a band can be within the distance
+        keys: Set[int] = set()
+        for band, value in zip(self._bands, _simhash_bands(simhash)):
+            keys.update(band.get(value, ()))
+        
+        best_key, best_jaccard = None, self.min_jaccard
+        for key in keys:
+            if (key ^ simhash).bit_count() > self.max_distance:
+                continue
+            candidate = self._entries[key][0]
+            union = len(shingles | candidate)
+            jaccard = len(shingles & candidate) / union if union else 0.0
+            if jaccard >= best_jaccard:
+                best_key, best_jaccard = key, jaccard
+        
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key][1]
+    
+    def add(self, text: str, embedding: np.ndarray):
+        """Remember a chunk's embedding, evicting the least recently used entry when full"""
+        shingles = _shingles(text)
+        if not shingles:
+            return
+        
+        simhash = _simhash64(shingles)
+        if simhash not in self._entries:
+            for band, value in zip(self._bands, _simhash_bands(simhash)):
+                band.setdefault(value, set()).add(simhash)
+        self._entries[simhash] = (shingles, embedding)
+        self._entries.move_to_end(simhash)
+        if len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            for band, value in zip(self._bands, _simhash_bands(evicted)):
+                keys = band[value]
+                keys.discard(evicted)
+                if not keys:
+                    del band[value]
+
+@lru_cache(maxsize=1)
+def get_fuzzy_embedding_index() -> Optional[FuzzyEmbeddingIndex]:
+    """Get the shared near-duplicate index, or None when disabled"""
+    threshold = config.embedding.fuzzy_threshold
+    if threshold <= 0:
+        return None
+    return FuzzyEmbeddingIndex(min(threshold, 1.0))
+
+@lru_cache(maxsize=1)
+def get_embedding_disk_cache() -> Optional[EmbeddingDiskCache]:
+    """Get the shared embedding disk cache, or None when disabled"""
+    path = config.embedding.disk_cache_path
+    if not path:
+        return None
+    
+    try:
+        # Output depends on the requested dimensions as well as the model
+        cache = EmbeddingDiskCache(path, f"{config.embedding.model}:{config.embedding.dimensions}")
+        logger.info(f"Embedding disk cache opened at {path}")
+        return cache
+    except Exception as error:
+        logger.warning(f"Embedding disk cache unavailable, embedding without it: {error}")
+        return None
+
+def close_embedding_disk_cache():
+    """Close the embedding disk cache if it was opened"""
+    if get_embedding_disk_cache.cache_info().currsize:
+        cache = get_embedding_disk_cache()
+        if cache is not None:
+            cache.close()
+        get_embedding_disk_cache.cache_clear()
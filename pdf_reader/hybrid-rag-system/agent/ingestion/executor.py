@@ -0,0 +1,38 @@
+"""
+Shared process pool for CPU-bound ingestion work
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from ..config import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Get the ingestion process pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        workers = max(1, config.processing.num_workers)
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        logger.info(f"Started ingestion process pool with {workers} workers")
+    return _pool
+
+async def run_in_process(func: Callable[..., T], *args: Any) -> T:
+    """Run a picklable module-level function in the ingestion process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+def shutdown_process_pool():
+    """Shut down the ingestion process pool if it was started"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+        logger.info("Ingestion process pool shut down")
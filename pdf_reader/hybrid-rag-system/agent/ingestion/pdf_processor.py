@@ -4,22 +4,196 @@ PDF processing utilities for text extraction and OCR
 
 import logging
 import asyncio
-from typing import Dict, Any, List, Optional, Tuple
+import io
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
-import tempfile
 import os
 
 # PDF processing libraries
 import PyPDF2
+try:
+    import pymupdf
+except ImportError:  # Fall back to the pure-Python PyPDF2 reader
+    pymupdf = None
 from pdf2image import convert_from_path
 import pytesseract
 from PIL import Image
 
 from ..config import config
 from ..models import Document, DocumentMetadata, DocumentStatus
+from .chunker import cache_preprocessed_text, preprocess_pages
+from .executor import run_in_process
 
 logger = logging.getLogger(__name__)
 
+# Document info keys of each reader, mapped to our metadata field names
+_PYPDF2_METADATA_KEYS = {
+    "/Title": "title",
+    "/Author": "author",
+    "/CreationDate": "creation_date",
+    "/Subject": "subject",
+    "/Creator": "creator",
+    "/Producer": "producer",
+    "/Keywords": "keywords",
+}
+_PYMUPDF_METADATA_KEYS = {
+    "title": "title",
+    "author": "author",
+    "creationDate": "creation_date",
+    "subject": "subject",
+    "creator": "creator",
+    "producer": "producer",
+    "keywords": "keywords",
+}
+
+def _pymupdf_info(doc) -> Dict[str, str]:
+    """Non-empty document info fields of an open PyMuPDF document"""
+    try:
+        pdf_meta = doc.metadata or {}
+        return {
+            name: str(pdf_meta[key])
+            for key, name in _PYMUPDF_METADATA_KEYS.items()
+            if pdf_meta.get(key)
+        }
+    except Exception as error:
+        logger.warning(f"Failed to extract PDF metadata: {error}")
+        return {}
+
+def _pypdf2_info(pdf_reader: PyPDF2.PdfReader) -> Dict[str, str]:
+    """Non-empty document info fields of an open PyPDF2 reader"""
+    try:
+        pdf_meta = pdf_reader.metadata or {}
+        return {
+            name: str(pdf_meta[key])
+            for key, name in _PYPDF2_METADATA_KEYS.items()
+            if pdf_meta.get(key)
+        }
+    except Exception as error:
+        logger.warning(f"Failed to extract PDF metadata: {error}")
+        return {}
+
+def _pymupdf_pages(doc) -> Iterator[Tuple[int, str]]:
+    """Yield (page_num, text) for each non-empty page of an open PyMuPDF document"""
+    for page_num, page in enumerate(doc):
+        try:
+            page_text = page.get_text()
+            if page_text.strip():
+                yield page_num, page_text
+        except Exception as page_error:
+            logger.warning(f"Failed to extract text from page {page_num + 1}: {page_error}")
+            continue
+
+def _pypdf2_pages(pdf_reader: PyPDF2.PdfReader) -> Iterator[Tuple[int, str]]:
+    """Yield (page_num, text) for each non-empty page of an open PyPDF2 reader"""
+    for page_num, page in enumerate(pdf_reader.pages):
+        try:
+            page_text = page.extract_text()
+            if page_text.strip():
+                yield page_num, page_text
+        except Exception as page_error:
+            logger.warning(f"Failed to extract text from page {page_num + 1}: {page_error}")
+            continue
+
+def _join_pages(pages: Iterable[Tuple[int, str]], label: str = "") -> str:
+    """Join page texts under page markers"""
+    # Markers and page texts are separate pieces, so no formatted copy of
+    # each page is made before the single final join
+    pieces = []
+    for page_num, page_text in pages:
+        if pieces:
+            pieces.append("\n\n")
+        pieces.append(f"--- Page {page_num + 1}{label} ---\n")
+        pieces.append(page_text)
+    return "".join(pieces)
+
+def _extract_text_layer(pages: Iterable[Tuple[int, str]], reader_name: str) -> Tuple[str, str]:
+    """Join the text layer of a PDF and preprocess it for chunking in the same pass"""
+    page_texts = []
+    
+    def tap_pages() -> Iterator[Tuple[int, str]]:
+        for page_num, page_text in pages:
+            page_texts.append(page_text)
+            yield page_num, page_text
+    
+    try:
+        full_text = _join_pages(tap_pages())
+        logger.debug(f"{reader_name} extracted {len(full_text)} characters")
+        # Preprocessed while the page texts are still at hand, so the chunker
+        # never rescans the joined document
+        return full_text, preprocess_pages(page_texts)
+        
+    except Exception as error:
+        logger.error(f"{reader_name} text extraction failed: {error}")
+        return "", ""
+
+def _read_pdf_bytes(file_path: str) -> bytes:
+    """Read a whole PDF in one sequential pass, so parsing seeks in memory rather than on disk"""
+    return Path(file_path).read_bytes()
+
+def _read_pdf(file_path: str) -> Tuple[int, Dict[str, str], Tuple[str, str]]:
+    """Parse a PDF once for its page count, document info and text layer; runs in the ingestion process pool"""
+    data = _read_pdf_bytes(file_path)
+    
+    if pymupdf is not None:
+        with pymupdf.open(stream=data, filetype="pdf") as doc:
+            return doc.page_count, _pymupdf_info(doc), _extract_text_layer(_pymupdf_pages(doc), "PyMuPDF")
+    
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(data))
+    return len(pdf_reader.pages), _pypdf2_info(pdf_reader), _extract_text_layer(_pypdf2_pages(pdf_reader), "PyPDF2")
+
+def _read_pdf_info(file_path: str) -> Tuple[int, Dict[str, str]]:
+    """Read the page count and non-empty document info fields of a PDF"""
+    if pymupdf is not None:
+        with pymupdf.open(file_path) as doc:
+            return doc.page_count, _pymupdf_info(doc)
+    
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return len(pdf_reader.pages), _pypdf2_info(pdf_reader)
+
+def _check_first_page(file_path: str) -> Optional[str]:
+    """Open a PDF and read its first page, returning a problem description if any"""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        
+        # Check if it has pages
+        if len(pdf_reader.pages) == 0:
+            return "PDF has no pages"
+        
+        # Try to read first page
+        first_page = pdf_reader.pages[0]
+        first_page.extract_text()  # This will raise an exception if corrupted
+    
+    return None
+
+_OCR_DPI = 200  # Good balance of quality and speed
+
+def _render_page(file_path: str, page_num: int) -> Image.Image:
+    """Render a single PDF page to an in-memory image"""
+    if pymupdf is not None:
+        with pymupdf.open(file_path) as doc:
+            pix = doc[page_num].get_pixmap(dpi=_OCR_DPI)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    
+    return convert_from_path(
+        file_path,
+        dpi=_OCR_DPI,
+        first_page=page_num + 1,
+        last_page=page_num + 1
+    )[0]
+
+def _ocr_page(file_path: str, page_num: int, language: str) -> str:
+    """Render and OCR a single page; runs in the ingestion process pool"""
+    try:
+        return pytesseract.image_to_string(
+            _render_page(file_path, page_num),
+            lang=language,
+            config='--psm 6'  # Uniform block of text
+        )
+    except Exception as page_error:
+        logger.warning(f"OCR failed for page {page_num + 1}: {page_error}")
+        return ""
+
 class PDFProcessingError(Exception):
     """Exception raised for PDF processing errors"""
     pass
@@ -45,11 +219,18 @@ class PDFProcessor:
             if not os.path.exists(file_path):
                 raise PDFProcessingError(f"File not found: {file_path}")
             
+            # Parse the PDF once for its metadata and text layer
+            try:
+                page_count, pdf_info, (text_layer, preprocessed_layer) = await run_in_process(_read_pdf, file_path)
+            except Exception as parse_error:
+                logger.warning(f"Failed to parse PDF: {parse_error}")
+                page_count, pdf_info, text_layer, preprocessed_layer = None, {}, "", ""
+            
             # Extract metadata
-            metadata = await self._extract_metadata(file_path, original_name)
+            metadata = self._build_metadata(file_path, original_name, page_count, pdf_info)
             
             # Extract text content
-            text_content = await self._extract_text(file_path)
+            text_content = await self._extract_text(file_path, text_layer, page_count)
             
             # Create document object
             document = Document(
@@ -58,13 +239,14 @@ class PDFProcessor:
                 file_path=file_path,
                 status=DocumentStatus.PROCESSING,
                 metadata=metadata,
+                extracted_text=text_content,
                 processing_started_at=None,  # Will be set by pipeline
                 processing_completed_at=None
             )
             
-            # Store extracted text in metadata
-            document.metadata.custom_fields["extracted_text"] = text_content
             document.metadata.custom_fields["text_length"] = len(text_content)
+            if text_content is text_layer:
+                cache_preprocessed_text(document, text_content, preprocessed_layer)
             
             logger.info(f"PDF processed successfully: {len(text_content)} characters extracted")
             return document
@@ -73,8 +255,14 @@ class PDFProcessor:
             logger.error(f"PDF processing failed for {original_name}: {error}")
             raise PDFProcessingError(f"Failed to process PDF: {error}")
     
-    async def _extract_metadata(self, file_path: str, original_name: str) -> DocumentMetadata:
-        """Extract metadata from PDF file"""
+    def _build_metadata(
+        self,
+        file_path: str,
+        original_name: str,
+        page_count: Optional[int],
+        pdf_info: Dict[str, str]
+    ) -> DocumentMetadata:
+        """Build document metadata from the parsed PDF info"""
         try:
             metadata = DocumentMetadata(
                 title=original_name,
@@ -82,37 +270,18 @@ class PDFProcessor:
                 file_type="application/pdf"
             )
             
-            # Extract PDF-specific metadata
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Basic info
-                metadata.page_count = len(pdf_reader.pages)
-                
-                # PDF metadata
-                if pdf_reader.metadata:
-                    pdf_meta = pdf_reader.metadata
-                    
-                    if pdf_meta.get('/Title'):
-                        metadata.title = str(pdf_meta['/Title'])
-                    
-                    if pdf_meta.get('/Author'):
-                        metadata.author = str(pdf_meta['/Author'])
-                    
-                    if pdf_meta.get('/CreationDate'):
-                        try:
-                            # Parse PDF date format
-                            creation_date = str(pdf_meta['/CreationDate'])
-                            # Basic parsing - could be enhanced
-                            metadata.custom_fields["creation_date"] = creation_date
-                        except Exception:
-                            pass
-                    
-                    # Additional metadata
-                    for key in ['/Subject', '/Creator', '/Producer', '/Keywords']:
-                        if pdf_meta.get(key):
-                            field_name = key.replace('/', '').lower()
-                            metadata.custom_fields[field_name] = str(pdf_meta[key])
+            # PDF-specific metadata
+            metadata.page_count = page_count
+            pdf_info = dict(pdf_info)
+            
+            if "title" in pdf_info:
+                metadata.title = pdf_info.pop("title")
+            
+            if "author" in pdf_info:
+                metadata.author = pdf_info.pop("author")
+            
+            # Creation date (raw PDF date string) and additional metadata
+            metadata.custom_fields.update(pdf_info)
             
             return metadata
             
@@ -125,16 +294,18 @@ class PDFProcessor:
                 file_type="application/pdf"
             )
     
-    async def _extract_text(self, file_path: str) -> str:
-        """Extract text from PDF using PyPDF2 and optionally OCR"""
+    async def _extract_text(
+        self,
+        file_path: str,
+        text_content: str,
+        page_count: Optional[int] = None
+    ) -> str:
+        """Choose between the extracted text layer and OCR output"""
         try:
-            # First, try standard text extraction
-            text_content = await self._extract_text_pypdf2(file_path)
-            
             # If text extraction yields little content and OCR is enabled, try OCR
             if len(text_content.strip()) < 100 and self.enable_ocr:
                 logger.info("Text extraction yielded little content, trying OCR")
-                ocr_content = await self._extract_text_ocr(file_path)
+                ocr_content = await self._extract_text_ocr(file_path, page_count)
                 
                 # Use OCR content if it's significantly longer
                 if len(ocr_content.strip()) > len(text_content.strip()) * 2:
@@ -147,32 +318,7 @@ class PDFProcessor:
             logger.error(f"Text extraction failed: {error}")
             raise PDFProcessingError(f"Failed to extract text: {error}")
     
-    async def _extract_text_pypdf2(self, file_path: str) -> str:
-        """Extract text using PyPDF2"""
-        try:
-            text_content = []
-            
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                for page_num, page in enumerate(pdf_reader.pages):
-                    try:
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text_content.append(f"--- Page {page_num + 1} ---\n{page_text}")
-                    except Exception as page_error:
-                        logger.warning(f"Failed to extract text from page {page_num + 1}: {page_error}")
-                        continue
-            
-            full_text = "\n\n".join(text_content)
-            logger.debug(f"PyPDF2 extracted {len(full_text)} characters")
-            return full_text
-            
-        except Exception as error:
-            logger.error(f"PyPDF2 text extraction failed: {error}")
-            return ""
-    
-    async def _extract_text_ocr(self, file_path: str) -> str:
+    async def _extract_text_ocr(self, file_path: str, page_count: Optional[int] = None) -> str:
         """Extract text using OCR (pdf2image + pytesseract)"""
         if not self.enable_ocr:
             return ""
@@ -180,41 +326,22 @@ class PDFProcessor:
         try:
             logger.info("Starting OCR text extraction")
             
-            # Convert PDF to images
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Convert PDF pages to images
-                images = convert_from_path(
-                    file_path,
-                    dpi=200,  # Good balance of quality and speed
-                    output_folder=temp_dir,
-                    fmt='jpeg'
-                )
-                
-                text_content = []
-                
-                for page_num, image in enumerate(images):
-                    try:
-                        # Perform OCR on the image
-                        page_text = pytesseract.image_to_string(
-                            image,
-                            lang=self.ocr_language,
-                            config='--psm 6'  # Uniform block of text
-                        )
-                        
-                        if page_text.strip():
-                            text_content.append(f"--- Page {page_num + 1} (OCR) ---\n{page_text}")
-                        
-                        # Small delay to prevent overwhelming the system
-                        if page_num < len(images) - 1:
-                            await asyncio.sleep(0.1)
-                            
-                    except Exception as page_error:
-                        logger.warning(f"OCR failed for page {page_num + 1}: {page_error}")
-                        continue
-                
-                full_text = "\n\n".join(text_content)
-                logger.info(f"OCR extracted {len(full_text)} characters from {len(images)} pages")
-                return full_text
+            if not page_count:
+                page_count, _ = await asyncio.to_thread(_read_pdf_info, file_path)
+            
+            # Each worker renders its page in memory and OCRs it, so no page
+            # images are written to disk or sent between processes
+            page_texts = await asyncio.gather(*(
+                run_in_process(_ocr_page, file_path, page_num, self.ocr_language)
+                for page_num in range(page_count)
+            ))
+            
+            full_text = _join_pages(
+                ((page_num, page_text) for page_num, page_text in enumerate(page_texts) if page_text.strip()),
+                label=" (OCR)"
+            )
+            logger.info(f"OCR extracted {len(full_text)} characters from {page_count} pages")
+            return full_text
                 
         except Exception as error:
             logger.error(f"OCR text extraction failed: {error}")
@@ -231,19 +358,9 @@ class PDFProcessor:
             if file_size == 0:
                 return False, "File is empty"
             
-            # Try to open with PyPDF2
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                
-                # Check if it has pages
-                if len(pdf_reader.pages) == 0:
-                    return False, "PDF has no pages"
-                
-                # Try to read first page
-                first_page = pdf_reader.pages[0]
-                first_page.extract_text()  # This will raise an exception if corrupted
-            
-            return True, None
+            # Try to open with PyPDF2, off the event loop
+            problem = await asyncio.to_thread(_check_first_page, file_path)
+            return problem is None, problem
             
         except Exception as error:
             return False, f"PDF validation failed: {error}"
@@ -272,9 +389,7 @@ class PDFProcessor:
             
             # Quick page count check
             try:
-                with open(file_path, 'rb') as file:
-                    pdf_reader = PyPDF2.PdfReader(file)
-                    page_count = len(pdf_reader.pages)
+                page_count, _ = await asyncio.to_thread(_read_pdf_info, file_path)
             except Exception:
                 page_count = max(1, int(file_size_mb))  # Rough estimate
             
@@ -4,19 +4,45 @@ Main ingestion pipeline that orchestrates PDF processing, chunking, embedding, a
 
 import asyncio
 import logging
+import time
+import uuid
 from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime
-import traceback
+from functools import partial
 
+import numpy as np
+
+from .embed_cache import close_embedding_disk_cache, content_digest, get_embedding_disk_cache, get_fuzzy_embedding_index
+from .executor import shutdown_process_pool
 from .pdf_processor import PDFProcessor
 from .chunker import SemanticChunker, ChunkingConfig
-from ..embeddings import generate_embeddings_batch, test_embedding_service
-from ..database import knowledge_graph
-from ..models import Document, DocumentStatus, ProcessingResult
+from ..embeddings import count_tokens, iter_embedding_vectors, test_embedding_service
+from ..config import config
+from ..models import Document, DocumentChunk, DocumentStatus, ProcessingResult
 from ..database import vector_store, knowledge_graph
 
 logger = logging.getLogger(__name__)
 
+# Chunks buffered between the chunker and the embedding consumers, and
+# the window each consumer embeds at a time
+_STREAM_QUEUE_SIZE = 64
+_STREAM_BATCH = 32
+
+def _report_batch_progress(
+    progress_callback: Callable[[str, float], None],
+    label: str,
+    base: float,
+    span: float,
+    current: int,
+    total: int
+):
+    """Report batch progress as a share of the [base, base + span] progress range"""
+    progress_callback(f"{label} ({current}/{total})", base + (current / total) * span)
+
+def _new_job_id() -> str:
+    """Unique job id, safe for jobs started within the same second"""
+    return f"job_{uuid.uuid4().hex[:16]}"
+
 class IngestionPipelineError(Exception):
     """Exception raised for ingestion pipeline errors"""
     pass
@@ -24,9 +50,11 @@ class IngestionPipelineError(Exception):
 class IngestionPipeline:
     """Main pipeline for processing PDFs into vector and graph stores"""
     
-    def __init__(self):
+    def __init__(self, vector_batch_size: int = 256):
         self.pdf_processor = PDFProcessor()
         self.chunker = SemanticChunker()
+        # Chunks per concurrent vector-store write
+        self.vector_batch_size = max(1, vector_batch_size)
         
         # Pipeline statistics
         self.stats = {
@@ -47,94 +75,330 @@ class IngestionPipeline:
         progress_callback: Optional[Callable[[str, float], None]] = None
     ) -> ProcessingResult:
         """Process a single document through the complete pipeline"""
-        start_time = datetime.now()
-        job_id = f"job_{int(start_time.timestamp())}"
+        result = await self._process_document(file_path, filename, original_name, metadata, progress_callback)
+        self._record_stats([result])
+        return result
+    
+    async def _process_document(
+        self,
+        file_path: str,
+        filename: str,
+        original_name: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> ProcessingResult:
+        """Process a single document, leaving its statistics on the result"""
+        start_time = time.monotonic()
+        job_id = _new_job_id()
+        document: Optional[Document] = None
         
         try:
             logger.info(f"Starting document processing: {original_name}")
             
-            # Initialize progress
-            if progress_callback:
-                progress_callback("Starting processing...", 0.0)
-            
-            # Step 1: PDF Processing (20%)
-            if progress_callback:
-                progress_callback("Extracting text from PDF...", 10.0)
-            
-            document = await self.pdf_processor.process_pdf(
-                file_path=file_path,
-                filename=filename,
-                original_name=original_name
+            # Steps 1-3: PDF processing, then chunking overlapped with embedding
+            document = await self._prepare_document(
+                file_path, filename, original_name, metadata, start_time, progress_callback, embed=True
             )
             
-            # Add custom metadata if provided
-            if metadata:
-                document.metadata.custom_fields.update(metadata)
-            
-            document.status = DocumentStatus.PROCESSING
-            document.processing_started_at = start_time
-            
-            if progress_callback:
-                progress_callback("Text extraction completed", 20.0)
-            
-            # Step 2: Document Chunking (40%)
-            if progress_callback:
-                progress_callback("Creating semantic chunks...", 25.0)
+            # Steps 4-6: Storage, knowledge graph and finalization
+            return await self._store_document(document, job_id, start_time, progress_callback)
             
+        except Exception as error:
+            return self._failure_result(error, document, original_name, job_id, start_time, progress_callback)
+    
+    async def process_documents_batched(
+        self,
+        file_info_list: List[Dict[str, str]],
+        progress_callback: Optional[Callable[[str, float], None]] = None,
+        max_concurrency: Optional[int] = None
+    ) -> List[ProcessingResult]:
+        """Process documents together, embedding all of their chunks in one pass"""
+        start_time = time.monotonic()
+        job_ids = [_new_job_id() for _ in file_info_list]
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or config.processing.num_workers))
+        
+        logger.info(f"Starting batched processing of {len(file_info_list)} documents")
+        
+        if progress_callback:
+            progress_callback("Extracting and chunking documents...", 10.0)
+        
+        async def prepare(file_info: Dict[str, str]) -> Document:
+            async with semaphore:
+                return await self._prepare_document(
+                    file_info["file_path"],
+                    file_info["filename"],
+                    file_info["original_name"],
+                    file_info.get("metadata"),
+                    start_time
+                )
+        
+        prepared = await asyncio.gather(
+            *(prepare(file_info) for file_info in file_info_list),
+            return_exceptions=True
+        )
+        documents = [document for document in prepared if not isinstance(document, BaseException)]
+        
+        if progress_callback:
+            progress_callback(f"Chunked {len(documents)}/{len(file_info_list)} documents", 40.0)
+        
+        # Embed every document's chunks as one stream, so the embedding
+        # service sees full batches instead of one tail batch per document
+        all_chunks = [chunk for document in documents for chunk in document.chunks]
+        embedding_error = None
+        try:
+            await self._embed_chunks(all_chunks, progress_callback)
+        except Exception as error:
+            embedding_error = error
+        
+        async def store(document: Document, job_id: str) -> ProcessingResult:
+            if embedding_error is not None:
+                return self._failure_result(embedding_error, document, document.original_name, job_id, start_time)
+            try:
+                async with semaphore:
+                    return await self._store_document(document, job_id, start_time)
+            except Exception as error:
+                return self._failure_result(error, document, document.original_name, job_id, start_time)
+        
+        if progress_callback:
+            progress_callback("Storing documents...", 65.0)
+        
+        stored = iter(await asyncio.gather(*(
+            store(outcome, job_id)
+            for outcome, job_id in zip(prepared, job_ids)
+            if not isinstance(outcome, BaseException)
+        )))
+        results = [
+            next(stored) if not isinstance(outcome, BaseException)
+            else self._failure_result(outcome, None, file_info.get("original_name", "unknown"), job_id, start_time)
+            for file_info, outcome, job_id in zip(file_info_list, prepared, job_ids)
+        ]
+        
+        self._record_stats(results)
+        
+        if progress_callback:
+            progress_callback("Batched processing completed", 100.0)
+        
+        logger.info(f"Batched processing completed: {len(results)} results")
+        return results
+    
+    async def _prepare_document(
+        self,
+        file_path: str,
+        filename: str,
+        original_name: str,
+        metadata: Optional[Dict[str, Any]],
+        start_time: float,
+        progress_callback: Optional[Callable[[str, float], None]] = None,
+        embed: bool = False
+    ) -> Document:
+        """Extract a PDF and chunk it (steps 1-2), embedding chunks as they are built when embed is set"""
+        # Initialize progress
+        if progress_callback:
+            progress_callback("Starting processing...", 0.0)
+        
+        # Step 1: PDF Processing (20%)
+        if progress_callback:
+            progress_callback("Extracting text from PDF...", 10.0)
+        
+        document = await self.pdf_processor.process_pdf(
+            file_path=file_path,
+            filename=filename,
+            original_name=original_name
+        )
+        
+        # Image-only or malformed PDFs fail here, before chunking runs
+        if not (document.extracted_text and document.extracted_text.strip()):
+            raise IngestionPipelineError("Empty PDF text")
+        
+        # Add custom metadata if provided
+        if metadata:
+            document.metadata.custom_fields.update(metadata)
+        
+        document.status = DocumentStatus.PROCESSING
+        document.processing_started_at = datetime.now()
+        
+        if progress_callback:
+            progress_callback("Text extraction completed", 20.0)
+        
+        # Step 2: Document Chunking (40%)
+        if progress_callback:
+            progress_callback("Creating semantic chunks...", 25.0)
+        
+        if embed:
+            chunks = await self._chunk_and_embed(document, progress_callback)
+        else:
             chunks = await self.chunker.chunk_document(document)
-            
-            if not chunks:
-                raise IngestionPipelineError("No chunks created from document")
-            
-            document.chunks = chunks
-            
-            if progress_callback:
-                progress_callback(f"Created {len(chunks)} chunks", 40.0)
-            
-            # Step 3: Generate Embeddings (60%)
-            if progress_callback:
-                progress_callback("Generating embeddings...", 45.0)
-            
-            def embedding_progress(current: int, total: int):
-                progress = 45.0 + (current / total) * 15.0
-                if progress_callback:
-                    progress_callback(f"Generating embeddings ({current}/{total})", progress)
-            
-            # Generate embeddings for all chunks
-            chunk_texts = [chunk.content for chunk in chunks]
-            embeddings = await generate_embeddings_batch(chunk_texts, embedding_progress)
-
-            # Assign embeddings to chunks
-            for chunk, embedding in zip(chunks, embeddings):
-                chunk.embedding = embedding
-            
-            if progress_callback:
-                progress_callback("Embeddings generated", 60.0)
-            
-            # Step 4: Store in Vector Database (70%)
-            if progress_callback:
-                progress_callback("Storing in vector database...", 65.0)
-            
-            vector_success = await vector_store.add_documents(chunks)
-            
-            if not vector_success:
-                logger.warning("Failed to store some chunks in vector database")
-            
-            if progress_callback:
-                progress_callback("Vector storage completed", 70.0)
-            
-            # Step 5: Build Knowledge Graph (90%)
-            if progress_callback:
-                progress_callback("Building knowledge graph...", 75.0)
-            
-            def graph_progress(current: int, total: int):
-                progress = 75.0 + (current / total) * 15.0
+        
+        if not chunks:
+            raise IngestionPipelineError("No chunks created from document")
+        
+        document.chunks = chunks
+        
+        if progress_callback:
+            progress_callback(f"Created {len(chunks)} chunks", 60.0 if embed else 40.0)
+        
+        return document
+    
+    async def _chunk_and_embed(
+        self,
+        document: Document,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> List[DocumentChunk]:
+        """Chunk a document while embedding finished windows of chunks concurrently (steps 2-3)"""
+        queue: "asyncio.Queue[Optional[DocumentChunk]]" = asyncio.Queue(maxsize=_STREAM_QUEUE_SIZE)
+        chunks: List[DocumentChunk] = []
+        consumers = max(1, config.embedding.max_concurrency)
+        embedded = 0
+        
+        async def produce():
+            async for chunk in self.chunker.chunk_document_stream(document, _STREAM_BATCH):
+                chunks.append(chunk)
+                await queue.put(chunk)
+            for _ in range(consumers):
+                await queue.put(None)
+        
+        async def consume():
+            nonlocal embedded
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    return
+                
+                # Take whatever else is already queued, up to one window
+                batch = [chunk]
+                while len(batch) < _STREAM_BATCH and not queue.empty():
+                    chunk = queue.get_nowait()
+                    if chunk is None:
+                        # Put the sentinel back so this consumer stops after the batch
+                        queue.put_nowait(None)
+                        break
+                    batch.append(chunk)
+                
+                await self._embed_chunks(batch)
+                embedded += len(batch)
                 if progress_callback:
-                    progress_callback(f"Processing entities ({current}/{total})", progress)
-            
-            # Build knowledge graph from document content
-            full_text = document.metadata.custom_fields.get("extracted_text", "")
-            episode_id = await knowledge_graph.add_episode(
+                    progress_callback(f"Generating embeddings ({embedded} chunks)", 45.0)
+        
+        if progress_callback:
+            progress_callback("Chunking and generating embeddings...", 30.0)
+        
+        tasks = [asyncio.create_task(produce())]
+        tasks.extend(asyncio.create_task(consume()) for _ in range(consumers))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        return chunks
+    
+    async def _embed_chunks(
+        self,
+        chunks: List[DocumentChunk],
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ):
+        """Generate embeddings for chunks, assigning each batch as it lands (step 3)"""
+        if progress_callback:
+            progress_callback("Generating embeddings...", 45.0)
+        
+        embedding_progress = (
+            partial(_report_batch_progress, progress_callback, "Generating embeddings", 45.0, 15.0)
+            if progress_callback else None
+        )
+        
+        # Reuse embeddings of chunk texts seen in earlier runs; only misses
+        # go to the embedding service
+        disk_cache = get_embedding_disk_cache()
+        digests: List[bytes] = []
+        if disk_cache is not None:
+            digests = [content_digest(chunk.content) for chunk in chunks]
+            cached = await asyncio.to_thread(disk_cache.get_many, digests)
+            missing = []
+            for i, (chunk, digest) in enumerate(zip(chunks, digests)):
+                embedding = cached.get(digest)
+                if embedding is None:
+                    missing.append(i)
+                else:
+                    chunk.embedding = embedding
+            if cached:
+                logger.info(f"Embedding disk cache: {len(chunks) - len(missing)}/{len(chunks)} chunks reused")
+        else:
+            missing = list(range(len(chunks)))
+        
+        # Chunks that differ from a recent one only by a typo or whitespace
+        # reuse its embedding instead of going to the embedding service
+        fuzzy_index = get_fuzzy_embedding_index()
+        if fuzzy_index is not None and missing:
+            missing_set = set(missing)
+            for i, chunk in enumerate(chunks):
+                if i not in missing_set:
+                    fuzzy_index.add(chunk.content, chunk.embedding)
+            
+            unmatched = []
+            for i in missing:
+                embedding = fuzzy_index.lookup(chunks[i].content)
+                if embedding is None:
+                    unmatched.append(i)
+                else:
+                    chunks[i].embedding = embedding
+            if len(unmatched) < len(missing):
+                logger.info(f"Fuzzy embedding cache: {len(missing) - len(unmatched)}/{len(missing)} near-duplicate chunks reused")
+            missing = unmatched
+        
+        # Embed in token-length order so each request batch holds similarly
+        # sized texts, then map results back through the permutation
+        order = sorted(missing, key=lambda i: count_tokens(chunks[i].content))
+        chunk_texts = [chunks[i].content for i in order]
+        # Chunks hold float16 vectors, halving embedding memory until the
+        # vector-store write decodes them
+        fresh: Dict[bytes, np.ndarray] = {}
+        async for index, embedding in iter_embedding_vectors(chunk_texts, embedding_progress):
+            chunk_index = order[index]
+            chunks[chunk_index].embedding = embedding
+            # Failed batches come back as zero vectors; never persist those
+            if not embedding.any():
+                continue
+            if fuzzy_index is not None:
+                fuzzy_index.add(chunk_texts[index], embedding)
+            if disk_cache is not None:
+                fresh[digests[chunk_index]] = embedding
+        
+        if fresh:
+            await asyncio.to_thread(disk_cache.put_many, fresh)
+        
+        if progress_callback:
+            progress_callback("Embeddings generated", 60.0)
+    
+    async def _store_document(
+        self,
+        document: Document,
+        job_id: str,
+        start_time: float,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> ProcessingResult:
+        """Store an embedded document and build its knowledge graph (steps 4-6)"""
+        chunks = document.chunks
+        
+        # Steps 4-5: Store in Vector Database and Build Knowledge Graph (90%)
+        if progress_callback:
+            progress_callback("Writing to vector database and knowledge graph...", 65.0)
+        
+        async def store_vectors() -> bool:
+            # Write in concurrent micro-batches so request round-trips overlap
+            # with server-side indexing
+            batch_size = self.vector_batch_size
+            results = await asyncio.gather(*(
+                vector_store.add_documents(chunks[i:i + batch_size])
+                for i in range(0, len(chunks), batch_size)
+            ))
+            return all(results)
+        
+        # The two backends share no data, so the graph build runs behind the
+        # vector writes instead of after them
+        full_text = document.extracted_text or "\n".join(chunk.content for chunk in chunks)
+        vector_outcome, graph_outcome = await asyncio.gather(
+            store_vectors(),
+            knowledge_graph.add_episode(
                 content=full_text,
                 source=document.original_name,
                 episode_id=document.document_id,
@@ -143,175 +407,226 @@ class IngestionPipeline:
                     "file_type": document.metadata.file_type,
                     "chunk_count": len(chunks)
                 }
-            )
-
-            graph_result = {
-                "entities_created": 1,  # Simplified for now
-                "relationships_created": 0,
-                "episode_id": episode_id
-            }
-            
-            if progress_callback:
-                progress_callback("Knowledge graph completed", 90.0)
-            
-            # Step 6: Finalize (100%)
-            if progress_callback:
-                progress_callback("Finalizing processing...", 95.0)
-            
-            # Update document status
-            document.status = DocumentStatus.COMPLETED
-            document.processing_completed_at = datetime.now()
-            
-            # Calculate processing time
-            processing_time = (document.processing_completed_at - start_time).total_seconds() * 1000
-            
-            # Update statistics
-            self.stats["documents_processed"] += 1
-            self.stats["chunks_created"] += len(chunks)
-            self.stats["embeddings_generated"] += len([c for c in chunks if c.embedding])
-            self.stats["entities_extracted"] += graph_result.get("entities_created", 0)
-            self.stats["relationships_created"] += graph_result.get("relationships_created", 0)
-            self.stats["total_processing_time"] += processing_time
-            
-            # Create result
-            result = ProcessingResult(
-                job_id=job_id,
-                document_id=document.document_id,
-                chunks_created=len(chunks),
-                entities_extracted=graph_result.get("entities_created", 0),
-                relationships_created=graph_result.get("relationships_created", 0),
-                processing_time_ms=processing_time,
-                success=True
-            )
-            
-            if progress_callback:
-                progress_callback("Processing completed successfully", 100.0)
-            
-            logger.info(f"Document processing completed: {original_name} in {processing_time:.1f}ms")
-            return result
-            
-        except Exception as error:
-            # Handle processing error
-            processing_time = (datetime.now() - start_time).total_seconds() * 1000
-            
-            logger.error(f"Document processing failed: {original_name}")
-            logger.error(f"Error: {error}")
-            logger.error(f"Traceback: {traceback.format_exc()}")
-            
-            # Update document status if it exists
-            try:
-                if 'document' in locals():
-                    document.status = DocumentStatus.FAILED
-                    document.error_message = str(error)
-                    document.processing_completed_at = datetime.now()
-            except Exception:
-                pass
-            
-            # Create error result
-            result = ProcessingResult(
-                job_id=job_id,
-                document_id=getattr(locals().get('document'), 'document_id', 'unknown'),
-                chunks_created=0,
-                entities_extracted=0,
-                relationships_created=0,
-                processing_time_ms=processing_time,
-                success=False,
-                error_message=str(error)
-            )
-            
-            if progress_callback:
-                progress_callback(f"Processing failed: {error}", 100.0)
-            
-            return result
+            ),
+            return_exceptions=True
+        )
+        
+        if isinstance(vector_outcome, BaseException):
+            logger.error(f"Vector storage failed for {document.original_name}: {vector_outcome}")
+        elif not vector_outcome:
+            logger.warning("Failed to store some chunks in vector database")
+        
+        if isinstance(graph_outcome, BaseException):
+            logger.error(f"Knowledge graph build failed for {document.original_name}: {graph_outcome}")
+        
+        # Either side failing still fails the document, once both have settled
+        for outcome in (vector_outcome, graph_outcome):
+            if isinstance(outcome, BaseException):
+                raise outcome
+        episode_id = graph_outcome
+        
+        graph_result = {
+            "entities_created": 1,  # Simplified for now
+            "relationships_created": 0,
+            "episode_id": episode_id
+        }
+        
+        if progress_callback:
+            progress_callback("Knowledge graph completed", 90.0)
+        
+        # Step 6: Finalize (100%)
+        if progress_callback:
+            progress_callback("Finalizing processing...", 95.0)
+        
+        # Update document status
+        document.status = DocumentStatus.COMPLETED
+        document.processing_completed_at = datetime.now()
+        
+        # Calculate processing time
+        processing_time = (time.monotonic() - start_time) * 1000.0
+        
+        # Statistics travel on the result and are aggregated by the caller
+        stats_delta = {
+            "documents_processed": 1,
+            "chunks_created": len(chunks),
+            "embeddings_generated": sum(1 for chunk in chunks if chunk.embedding is not None),
+            "entities_extracted": graph_result.get("entities_created", 0),
+            "relationships_created": graph_result.get("relationships_created", 0),
+            "total_processing_time": processing_time,
+        }
+        
+        # Create result
+        result = ProcessingResult(
+            job_id=job_id,
+            document_id=document.document_id,
+            chunks_created=len(chunks),
+            entities_extracted=graph_result.get("entities_created", 0),
+            relationships_created=graph_result.get("relationships_created", 0),
+            processing_time_ms=processing_time,
+            success=True,
+            stats=stats_delta
+        )
+        
+        if progress_callback:
+            progress_callback("Processing completed successfully", 100.0)
+        
+        logger.info(f"Document processing completed: {document.original_name} in {processing_time:.1f}ms")
+        return result
+    
+    def _failure_result(
+        self,
+        error: Exception,
+        document: Optional[Document],
+        original_name: str,
+        job_id: str,
+        start_time: float,
+        progress_callback: Optional[Callable[[str, float], None]] = None
+    ) -> ProcessingResult:
+        """Mark a document failed and build its error result"""
+        # Only needed on the error path
+        import traceback
+        
+        # Handle processing error
+        processing_time = (time.monotonic() - start_time) * 1000.0
+        
+        logger.error(f"Document processing failed: {original_name}")
+        logger.error(f"Error: {error}")
+        logger.error(f"Traceback: {''.join(traceback.format_exception(error))}")
+        
+        # Update document status if it exists
+        try:
+            if document is not None:
+                document.status = DocumentStatus.FAILED
+                document.error_message = str(error)
+                document.processing_completed_at = datetime.now()
+        except Exception:
+            pass
+        
+        # Create error result
+        result = ProcessingResult(
+            job_id=job_id,
+            document_id=document.document_id if document is not None else 'unknown',
+            chunks_created=0,
+            entities_extracted=0,
+            relationships_created=0,
+            processing_time_ms=processing_time,
+            success=False,
+            error_message=str(error)
+        )
+        
+        if progress_callback:
+            progress_callback(f"Processing failed: {error}", 100.0)
+        
+        return result
     
     async def process_multiple_documents(
         self,
         file_info_list: List[Dict[str, str]],
-        progress_callback: Optional[Callable[[str, float, int, int], None]] = None
+        progress_callback: Optional[Callable[[str, float, int, int], None]] = None,
+        max_concurrency: Optional[int] = None
     ) -> List[ProcessingResult]:
         """Process multiple documents concurrently"""
-        results = []
         total_docs = len(file_info_list)
+        # Bound in-flight documents, by default to the worker count so the pool stays busy
+        semaphore = asyncio.Semaphore(max(1, max_concurrency or config.processing.num_workers))
+        
+        # Per-document progress; overall progress is their mean, since
+        # documents advance concurrently rather than one after another
+        doc_progresses = [0.0] * total_docs
         
         logger.info(f"Starting batch processing of {total_docs} documents")
         
-        for i, file_info in enumerate(file_info_list):
-            try:
-                # Individual document progress callback
-                def doc_progress(message: str, progress: float):
-                    if progress_callback:
-                        overall_progress = ((i + progress / 100.0) / total_docs) * 100.0
-                        progress_callback(
-                            f"Document {i+1}/{total_docs}: {message}",
-                            overall_progress,
-                            i + 1,
-                            total_docs
-                        )
-                
-                # Process document
-                result = await self.process_document(
+        async def process_one(i: int, file_info: Dict[str, str]) -> ProcessingResult:
+            # Individual document progress callback
+            def doc_progress(message: str, progress: float):
+                doc_progresses[i] = progress
+                if progress_callback:
+                    progress_callback(
+                        f"Document {i+1}/{total_docs}: {message}",
+                        sum(doc_progresses) / total_docs,
+                        i + 1,
+                        total_docs
+                    )
+            
+            # Process document
+            async with semaphore:
+                return await self._process_document(
                     file_path=file_info["file_path"],
                     filename=file_info["filename"],
                     original_name=file_info["original_name"],
                     metadata=file_info.get("metadata"),
                     progress_callback=doc_progress
                 )
-                
-                results.append(result)
-                
-                # Small delay between documents
-                if i < total_docs - 1:
-                    await asyncio.sleep(0.5)
-                
-            except Exception as error:
-                logger.error(f"Failed to process document {file_info.get('original_name', 'unknown')}: {error}")
-                
-                # Create error result
-                error_result = ProcessingResult(
-                    job_id=f"batch_job_{i}",
-                    document_id="unknown",
-                    chunks_created=0,
-                    entities_extracted=0,
-                    relationships_created=0,
-                    processing_time_ms=0,
-                    success=False,
-                    error_message=str(error)
-                )
-                results.append(error_result)
+        
+        tasks = [
+            asyncio.create_task(process_one(i, file_info))
+            for i, file_info in enumerate(file_info_list)
+        ]
+        outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+        
+        results = []
+        for file_info, outcome in zip(file_info_list, outcomes):
+            if not isinstance(outcome, BaseException):
+                results.append(outcome)
+                continue
+            
+            logger.error(f"Failed to process document {file_info.get('original_name', 'unknown')}: {outcome}")
+            
+            # Create error result
+            results.append(ProcessingResult(
+                job_id=_new_job_id(),
+                document_id="unknown",
+                chunks_created=0,
+                entities_extracted=0,
+                relationships_created=0,
+                processing_time_ms=0,
+                success=False,
+                error_message=str(outcome)
+            ))
+        
+        self._record_stats(results)
         
         logger.info(f"Batch processing completed: {len(results)} results")
         return results
     
+    def _record_stats(self, results: List[ProcessingResult]):
+        """Fold per-document statistics into the pipeline totals"""
+        for result in results:
+            for key, value in result.stats.items():
+                self.stats[key] += value
+    
     async def validate_pipeline(self) -> Dict[str, bool]:
         """Validate that all pipeline components are working"""
-        validation_results = {}
-        
-        try:
-            # Test PDF processor
-            validation_results["pdf_processor"] = True  # Basic validation
-            
-            # Test chunker
-            validation_results["chunker"] = True  # Basic validation
-            
-            # Test embedding service
-            validation_results["embedding_service"] = await test_embedding_service()
-            
-            # Test vector store
+        async def check_vector_store() -> bool:
             try:
                 await vector_store.get_collection_info()
-                validation_results["vector_store"] = True
+                return True
             except Exception:
-                validation_results["vector_store"] = False
-            
-            # Test knowledge graph
+                return False
+        
+        async def check_knowledge_graph() -> bool:
             try:
-                if knowledge_graph.driver:
-                    await knowledge_graph.driver.verify_connectivity()
-                    validation_results["knowledge_graph"] = True
-                else:
-                    validation_results["knowledge_graph"] = False
+                return await knowledge_graph.verify_connectivity()
             except Exception:
-                validation_results["knowledge_graph"] = False
+                return False
+        
+        try:
+            validation_results = {
+                # Basic validation
+                "pdf_processor": True,
+                "chunker": True,
+            }
+            
+            # The services are independent, so probe them concurrently
+            (
+                validation_results["embedding_service"],
+                validation_results["vector_store"],
+                validation_results["knowledge_graph"],
+            ) = await asyncio.gather(
+                test_embedding_service(),
+                check_vector_store(),
+                check_knowledge_graph()
+            )
             
             logger.info(f"Pipeline validation completed: {validation_results}")
             return validation_results
@@ -374,3 +689,8 @@ async def validate_ingestion_pipeline() -> Dict[str, bool]:
 def get_ingestion_stats() -> Dict[str, Any]:
     """Get ingestion pipeline statistics"""
     return ingestion_pipeline.get_pipeline_stats()
+
+def close_ingestion_pipeline():
+    """Release the ingestion worker processes and embedding disk cache"""
+    shutdown_process_pool()
+    close_embedding_disk_cache()
@@ -0,0 +1,32 @@
+"""
+Tests for the semantic chunker's text splitting
+"""
+
+import pytest
+
+from agent.ingestion import chunker
+from agent.ingestion.chunker import ChunkingConfig, SemanticChunker
+
+SENTENCE = "The quarterly report covers revenue, costs and the outlook for the next period. "
+
+@pytest.fixture
+def semantic_chunker(monkeypatch):
+    """Chunker built with the default config and no LLM provider"""
+    monkeypatch.setattr(chunker, "get_llm_model", lambda: None)
+    return SemanticChunker()
+
+def test_default_config_builds_splitter(semantic_chunker):
+    """The default sizes give a working splitter"""
+    assert callable(semantic_chunker.split_text)
+
+def test_default_config_chunk_sizes(semantic_chunker):
+    """Chunks fill up to the target size without exceeding it"""
+    config = ChunkingConfig()
+    text = "\n\n".join(SENTENCE * 8 for _ in range(40))
+    
+    chunks = semantic_chunker.split_text(text)
+    
+    assert len(chunks) > 1
+    assert all(len(chunk) <= config.chunk_size for chunk in chunks)
+    # Only the tail of the document may come out short
+    assert all(len(chunk) >= config.chunk_size // 2 for chunk in chunks[:-1])
@@ -139,10 +139,29 @@ class PDFWorker {
         }
       );
 
+      // Poll the agent until the queued processing job finishes
+      const agentJobId = agentResponse.data.job_id;
+      const deadline = Date.now() + config.agent.timeout;
+      let agentJob;
+
+      do {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const statusResponse = await axios.get(
+          `${config.agent.url}/process/pdf/${agentJobId}`,
+          { headers: { 'X-Job-ID': job.id } }
+        );
+        agentJob = statusResponse.data;
+        await job.updateProgress(20 + Math.round(agentJob.progress * 0.7));
+      } while (['queued', 'processing'].includes(agentJob.status) && Date.now() < deadline);
+
+      if (agentJob.status !== 'completed') {
+        throw new Error(agentJob.error_message || 'Agent processing timed out');
+      }
+
       // Update progress: Processing complete
       await job.updateProgress(90);
 
-      const result = agentResponse.data;
+      const result = agentJob.result;
       const duration = Date.now() - startTime;
 
       // Update progress: Finalizing